@@ -3,6 +3,8 @@ import matplotlib.pyplot as plt
 import skrf as rf
 import customtkinter as ctk
 from tkinter import ttk, messagebox
+import touchstone
+import z2param
 
 
 # Función para mostrar la matriz seleccionada
@@ -12,122 +14,277 @@ def mostrar():
 
     if matriz_seleccionada in matrices:
         matriz_valores = matrices[matriz_seleccionada]
-        mostrar_ventana_matriz(matriz_seleccionada, matriz_valores, freq)
+        freq_matriz = s2p_freq if matriz_seleccionada == "Archivo S2P" else frecuencias
+        mostrar_ventana_matriz(matriz_seleccionada, matriz_valores, freq_matriz)
     else:
         ctk.CTkMessagebox.show_info("Error", "Selecciona una matriz válida")
 
+# Filas de la tabla de valores, solo se formatean las que se ven
+FILAS_VISIBLES = 20
+
+#Clase para una tabla virtual de un arreglo de matrices (F, P, P)
+class TablaMatriz:
+    """
+    Tabla con una fila por frecuencia y una columna por posición de la matriz.
+    
+    La tabla solo tiene FILAS_VISIBLES filas: al desplazarse se cambia la primera frecuencia
+    mostrada y se formatean únicamente esas filas, sin importar cuántas frecuencias haya.
+    En modo resumen muestra una fila por posición con el mínimo y el máximo de su magnitud
+    y la frecuencia a la que ocurren.
+    """
+
+    def __init__(self, contenedor, matriz, freqs):
+        self.matriz = np.asarray(matriz)
+        self.freqs = np.asarray(freqs, dtype=float)
+        self.inicio = 0
+        F, P, _ = self.matriz.shape
+        self.posiciones = [(m, n) for m in range(P) for n in range(P)]
+
+        # Tabla de valores con filas fijas que se reutilizan
+        self.marco = ctk.CTkFrame(contenedor)
+        self.valores = ctk.CTkFrame(self.marco)
+        columnas = ["indice", "frecuencia"] + [f"{m + 1},{n + 1}" for m, n in self.posiciones]
+        self.tabla = ttk.Treeview(self.valores, columns=columnas, show="headings", height=FILAS_VISIBLES, selectmode="none")
+        self.tabla.heading("indice", text="#")
+        self.tabla.heading("frecuencia", text="Frecuencia (MHz)")
+        self.tabla.column("indice", width=70, anchor="e", stretch=False)
+        self.tabla.column("frecuencia", width=120, anchor="e", stretch=False)
+        for columna in columnas[2:]:
+            self.tabla.heading(columna, text=f"({columna})")
+            self.tabla.column(columna, width=180, anchor="e")
+        self.filas = [self.tabla.insert("", "end") for _ in range(FILAS_VISIBLES)]
+
+        # La barra de desplazamiento representa todas las frecuencias, no las filas de la tabla
+        self.barra = ttk.Scrollbar(self.valores, orient="vertical", command=self.__desplazar)
+        barra_horizontal = ttk.Scrollbar(self.valores, orient="horizontal", command=self.tabla.xview)
+        self.tabla.configure(xscrollcommand=barra_horizontal.set)
+        self.tabla.grid(row=0, column=0, sticky="nsew")
+        self.barra.grid(row=0, column=1, sticky="ns")
+        barra_horizontal.grid(row=1, column=0, sticky="ew")
+        self.valores.grid_columnconfigure(0, weight=1)
+        for evento in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tabla.bind(evento, self.__rueda)
+
+        # Tabla del resumen, se calcula la primera vez que se pide
+        self.resumen = ttk.Treeview(self.marco, columns=["posicion", "min", "fmin", "max", "fmax"], show="headings", height=min(len(self.posiciones), FILAS_VISIBLES), selectmode="none")
+        for columna, texto in zip(self.resumen["columns"], ["Posición", "Mín |x|", "Frecuencia mín (MHz)", "Máx |x|", "Frecuencia máx (MHz)"]):
+            self.resumen.heading(columna, text=texto)
+            self.resumen.column(columna, width=140, anchor="e")
+        self.resumen_calculado = False
+
+        self.valores.pack(fill="both", expand=True)
+        self.marco.pack(padx=10, pady=10, fill="both", expand=True)
+        self.ir_a(0)
+
+    def ir_a(self, indice):
+        """Muestra las filas a partir del índice de frecuencia dado."""
+        F = len(self.freqs)
+        self.inicio = int(min(max(indice, 0), max(F - FILAS_VISIBLES, 0)))
+        for fila, i in zip(self.filas, range(self.inicio, self.inicio + FILAS_VISIBLES)):
+            if i < F:
+                valores = [i, f"{self.freqs[i] / 1e6:.6g}"] + [f"{self.matriz[i, m, n]:.6g}" for m, n in self.posiciones]
+            else:
+                valores = []
+            self.tabla.item(fila, values=valores)
+        if F:
+            self.barra.set(self.inicio / F, min(self.inicio + FILAS_VISIBLES, F) / F)
+        else:
+            self.barra.set(0, 1)
+
+    def ir_a_frecuencia(self, frecuencia):
+        """Muestra las filas a partir de la frecuencia más cercana, en Hz."""
+        cercana = np.searchsorted(self.freqs, frecuencia)
+        if cercana > 0 and (cercana == len(self.freqs) or frecuencia - self.freqs[cercana - 1] < self.freqs[cercana] - frecuencia):
+            cercana -= 1
+        self.ir_a(cercana)
+
+    def mostrar_resumen(self, resumen):
+        """Cambia entre la tabla de valores y el resumen de mínimos y máximos por posición."""
+        if resumen:
+            if not self.resumen_calculado:
+                self.__calcular_resumen()
+            self.valores.pack_forget()
+            self.resumen.pack(fill="both", expand=True)
+        else:
+            self.resumen.pack_forget()
+            self.valores.pack(fill="both", expand=True)
+
+    def __calcular_resumen(self):
+        # Mínimo y máximo de la magnitud de cada posición en todas las frecuencias, ignorando los NaN
+        magnitudes = np.abs(self.matriz)
+        vacios = np.isnan(magnitudes)
+        minimos = np.where(vacios, np.inf, magnitudes).argmin(axis=0)
+        maximos = np.where(vacios, -np.inf, magnitudes).argmax(axis=0)
+        for m, n in self.posiciones:
+            i_min, i_max = minimos[m, n], maximos[m, n]
+            self.resumen.insert("", "end", values=[
+                f"({m + 1},{n + 1})",
+                f"{magnitudes[i_min, m, n]:.6g}", f"{self.freqs[i_min] / 1e6:.6g}",
+                f"{magnitudes[i_max, m, n]:.6g}", f"{self.freqs[i_max] / 1e6:.6g}",
+            ])
+        self.resumen_calculado = True
+
+    def __desplazar(self, accion, cantidad, unidad=None):
+        # Comandos de la barra: ("moveto", fracción) o ("scroll", n, "units" | "pages")
+        if accion == "moveto":
+            self.ir_a(round(float(cantidad) * len(self.freqs)))
+        elif unidad == "pages":
+            self.ir_a(self.inicio + int(cantidad) * FILAS_VISIBLES)
+        else:
+            self.ir_a(self.inicio + int(cantidad))
+
+    def __rueda(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.ir_a(self.inicio - 3)
+        else:
+            self.ir_a(self.inicio + 3)
+        return "break"
+
 # Función para crear la ventana emergente que muestra la matriz
 def mostrar_ventana_matriz(nombre, matriz, freqs):
     ventana_matriz = ctk.CTkToplevel()  # Crear una ventana secundaria
     ventana_matriz.title(f"Valores de {nombre}")
-    ventana_matriz.geometry("300x200")
+    ventana_matriz.geometry("900x600")
     
-    # Crear un texto con la información de cada matriz para cada frecuencia
-    texto = ""
-    for i, matriz in enumerate(matriz):
-        texto += f"Frecuencia: {freqs[i] / 1e6:.2f} MHz\n"
-        texto += "\n".join(["\t".join(map(str, fila)) for fila in matriz])
-        texto += "\n\n"
-    
-    # Mostrar el nombre de la matriz y sus valores
-    etiqueta_nombre = ctk.CTkLabel(ventana_matriz, text=f"Matriz: {nombre}", font=("Arial", 14, "bold"))
+    # Mostrar el nombre de la matriz
+    etiqueta_nombre = ctk.CTkLabel(ventana_matriz, text=f"Matriz: {nombre} ({len(freqs)} frecuencias)", font=("Arial", 14, "bold"))
     etiqueta_nombre.pack(pady=10)
 
-    # Usar un cuadro de texto con scroll para mostrar matrices grandes
-    text_box = ctk.CTkTextbox(ventana_matriz, wrap="none", height=300)
-    text_box.insert("1.0", texto)
-    text_box.configure(state="disabled")  # Hacerlo de solo lectura
-    text_box.pack(padx=10, pady=10, fill="both", expand=True)
+    # Controles para saltar a un índice o frecuencia y para el modo resumen
+    controles = ctk.CTkFrame(ventana_matriz)
+    controles.pack(padx=10, fill="x")
+    entrada = ctk.CTkEntry(controles, placeholder_text="Índice o frecuencia (MHz)")
+    entrada.pack(side="left", padx=5, pady=5)
+
+    # Tabla que solo formatea las filas visibles
+    tabla = TablaMatriz(ventana_matriz, matriz, freqs)
+
+    def ir_a(frecuencia):
+        try:
+            valor = float(entrada.get())
+        except ValueError:
+            messagebox.showerror("Error", "Ingresa un número válido.", parent=ventana_matriz)
+            return
+        if frecuencia:
+            tabla.ir_a_frecuencia(valor * 1e6)
+        else:
+            tabla.ir_a(int(valor))
+
+    boton_indice = ctk.CTkButton(controles, text="Ir a índice", width=100, command=lambda: ir_a(False))
+    boton_indice.pack(side="left", padx=5)
+    boton_frecuencia = ctk.CTkButton(controles, text="Ir a frecuencia", width=100, command=lambda: ir_a(True))
+    boton_frecuencia.pack(side="left", padx=5)
+    entrada.bind("<Return>", lambda event: ir_a(True))
+    resumen = ctk.CTkSwitch(controles, text="Resumen mín/máx", command=lambda: tabla.mostrar_resumen(resumen.get()))
+    resumen.pack(side="right", padx=5)
 
     # Botón para cerrar la ventana
     boton_cerrar = ctk.CTkButton(ventana_matriz, text="Cerrar", command=ventana_matriz.destroy)
     boton_cerrar.pack(pady=10)
     
 #Función para leer un archivo s2p
-def read_s2p(filename):
+def read_s2p(filename, mostrar_velocidad=False):
     """
-    Lee un archivo .s2p y extrae la frecuencia, los parámetros S y la resistencia de referencia.
+    Lee un archivo Touchstone (.s1p a .sNp) y extrae la frecuencia, los parámetros S y la resistencia de referencia.
+    
+    Los datos se leen en bloque con touchstone.read_touchstone, en formato RI, MA o DB y en
+    unidades Hz, kHz, MHz o GHz. Los archivos con parámetros Z o Y se convierten a parámetros S.
     
     Args:
         filename (str): Ruta del archivo .s2p.
+        mostrar_velocidad (bool, opcional): Imprimir el tiempo y la velocidad de lectura.
     
     Returns:
         tuple: 
-            - freq (numpy.ndarray): Vector de frecuencias.
-            - s_params (numpy.ndarray): Matriz de parámetros S (complejos).
+            - freq (numpy.ndarray): Vector de frecuencias en Hz.
+            - s_params (numpy.ndarray): Matrices de parámetros S (F, N, N) complejas.
             - z_ref (float): Resistencia de referencia.
     """
-    frequencies = []
-    s_parameters = []
-    z_ref = None  # Inicializa la resistencia de referencia
-
     try:
-        with open(filename, 'r') as file:
-            for line in file:
-                # Ignora comentarios y líneas vacías
-                if line.startswith('!') or line.strip() == '':
-                    continue
-                
-                # Procesa la línea de encabezado
-                if line.startswith('#'):
-                    header_parts = line.split()
-                    try:
-                        z_ref = float(header_parts[5])
-                    except (IndexError, ValueError):
-                        raise ValueError("El formato de la línea de encabezado no es válido.")
-                    continue
-                
-                # Procesa los datos de los parámetros S
-                parts = line.split()
-                if len(parts) >= 9:
-                    try:
-                        freq = float(parts[0])
-                        s11 = complex(float(parts[1]), float(parts[2]))
-                        s21 = complex(float(parts[3]), float(parts[4]))
-                        s12 = complex(float(parts[5]), float(parts[6]))
-                        s22 = complex(float(parts[7]), float(parts[8]))
-                    except ValueError:
-                        raise ValueError("El formato de los datos de parámetros S no es válido.")
-                    
-                    #Matriz S para determinada frecuencia
-                    matriz_s = np.array([[s11, s12], [s21, s22]], dtype=complex)
-                    
-                    #Guardar la frecuencia y la matriz
-                    frequencies.append(freq)
-                    s_parameters.append(matriz_s)
-
-        # Verifica que se haya leído la resistencia de referencia
-        if z_ref is None:
-            raise ValueError("No se encontró la resistencia de referencia en el archivo.")
-        
-        return frequencies, s_parameters, z_ref
-    
+        datos = touchstone.read_touchstone(filename)
     except FileNotFoundError:
         raise FileNotFoundError(f"No se encontró el archivo: {filename}")
     except Exception as e:
         raise RuntimeError(f"Ocurrió un error al procesar el archivo: {e}")
 
+    # Velocidad de lectura
+    if mostrar_velocidad:
+        print(f"{filename}: {len(datos)} frecuencias leídas en {datos.seconds:.3f} s ({datos.throughput:.1f} MB/s)")
+
+    s_params = z2param.convert(datos.parameters, datos.parameter, "S", datos.z_ref)
+    return datos.frequencies, s_params, datos.z_ref
+
+#Función para leer un archivo s2p por bloques de frecuencias
+def read_s2p_bloques(filename, tamano_bloque=touchstone.BLOCK_SIZE):
+    """
+    Lee un archivo Touchstone por bloques de frecuencias, sin cargarlo completo en memoria.
+    
+    Args:
+        filename (str): Ruta del archivo .s2p.
+        tamano_bloque (int): Número de frecuencias de cada bloque.
+    
+    Yields:
+        tuple: 
+            - freq (numpy.ndarray): Frecuencias del bloque en Hz.
+            - s_params (numpy.ndarray): Matrices de parámetros S (F, N, N) del bloque.
+            - z_ref (float): Resistencia de referencia.
+    """
+    try:
+        for bloque in touchstone.iter_touchstone(filename, tamano_bloque):
+            s_params = z2param.convert(bloque.parameters, bloque.parameter, "S", bloque.z_ref)
+            yield bloque.frequencies, s_params, bloque.z_ref
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No se encontró el archivo: {filename}")
+    except ValueError as e:
+        raise RuntimeError(f"Ocurrió un error al procesar el archivo: {e}")
+
 #Función para convertir parámetros S a ABCD
 def s2ABCD(param, z_ref):
     
     if len(param) != 4:
         raise ValueError("Error")
     
-    
     s11, s12, s21, s22 = param
     
-    abcd_mat = [0]*4
+    abcd_mat = s2ABCD_arreglo(np.array([[s11, s12], [s21, s22]], dtype=complex), z_ref)
     
-    denom = 2 * s21
-        
-    abcd_mat[0] = complex(((1+s11) * (1-s22) + (s12*s21)) / (denom))
-    abcd_mat[1] = complex(z_ref * ((1+s11) * (1+s22) - (s12*s21)) / (denom))
-    abcd_mat[2] = complex((1/z_ref) * ((1+s11) * (1+s22) - (s12*s21)) / (denom)) 
-    abcd_mat[3] = complex(((1-s11) * (1+s22) + (s12*s21)) / (denom))
+    return [complex(valor) for valor in abcd_mat.ravel()]
+
+#Función para convertir arreglos de parámetros S a ABCD
+def s2ABCD_arreglo(s_params, z_ref):
+    """
+    Convierte un arreglo de matrices S (F, 2, 2) a matrices ABCD (F, 2, 2) de una sola vez.
     
+    Las frecuencias donde la conversión no existe (S21 = 0) quedan en NaN en lugar de lanzar un error.
+    
+    Args:
+        s_params (numpy.ndarray): Matrices de parámetros S (F, 2, 2).
+        z_ref (float): Impedancia de referencia, o una por puerto.
+    
+    Returns:
+        numpy.ndarray: Matrices de parámetros ABCD (F, 2, 2).
+    """
+    s_params = np.asarray(s_params, dtype=complex)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        abcd_mat = z2param.s2abcd(s_params, z_ref)
+    
+    #Marca como NaN los puntos singulares
+    singular = (s_params[..., 1, 0] == 0) | ~np.isfinite(abcd_mat).all(axis=(-2, -1))
+    abcd_mat[singular] = np.nan
     
     return abcd_mat
 
+#Función para convertir por bloques parámetros S a ABCD
+def s2ABCD_bloques(bloques):
+    """
+    Convierte a ABCD cada bloque (freq, s_params, z_ref) de read_s2p_bloques, a medida que se leen.
+    
+    Yields:
+        tuple: freq, abcd_params (F, 2, 2) y z_ref de cada bloque.
+    """
+    for freq, s_params, z_ref in bloques:
+        yield freq, s2ABCD_arreglo(s_params, z_ref), z_ref
+
 #Función para convertir parámetros ABCD a red de dos puertos    
 def ABCD_2Port(param, freq):
     
@@ -136,9 +293,35 @@ def ABCD_2Port(param, freq):
     
     A, B, C, D = param
     
-    Yc = complex(1 / B)
-    Ya = complex((D/B) - 1)
-    Yb = complex((A/B) - 1)
+    Yc, Ya, Yb = ABCD_2Port_arreglo(np.array([[A, B], [C, D]], dtype=complex))
+    
+    return complex(Yc), complex(Ya), complex(Yb)
+
+#Función para convertir arreglos de parámetros ABCD a red pi de dos puertos
+def ABCD_2Port_arreglo(abcd_params):
+    """
+    Calcula las admitancias de la red pi equivalente de un arreglo de matrices ABCD (F, 2, 2).
+    
+    Yc es la admitancia serie, Ya la de derivación del puerto 1 y Yb la del puerto 2.
+    Las frecuencias donde B = 0 (sin red pi equivalente) quedan en NaN.
+    
+    Args:
+        abcd_params (numpy.ndarray): Matrices de parámetros ABCD (F, 2, 2).
+    
+    Returns:
+        tuple: Arreglos (F,) Yc, Ya y Yb.
+    """
+    abcd_params = np.asarray(abcd_params, dtype=complex)
+    A, B, D = abcd_params[..., 0, 0], abcd_params[..., 0, 1], abcd_params[..., 1, 1]
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Yc = 1 / B
+        Ya = (D - 1) / B
+        Yb = (A - 1) / B
+    
+    #Marca como NaN los puntos singulares
+    singular = (B == 0) | ~np.isfinite(B)
+    Yc, Ya, Yb = (np.where(singular, np.nan, Y) for Y in (Yc, Ya, Yb))
     
     return Yc, Ya, Yb
     
@@ -146,10 +329,9 @@ def ABCD_2Port(param, freq):
 def parameter2dB(parameter):
     mag = np.abs(parameter)
     
-    if mag == 0:
-        return -np.inf
-    #Conversión de magnitud a dB
-    dB = 20 * np.log10(mag)
+    #Conversión de magnitud a dB, -inf si la magnitud es 0 (funciona con números y arreglos)
+    with np.errstate(divide="ignore"):
+        dB = 20 * np.log10(mag)
     
     return dB
 
@@ -176,279 +358,218 @@ def parameter2img(parameter):
     return img
 
 
-# Función para graficar las magnitudes de las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz
-def plot_mag(matriz_seleccionada, freq):
+# Número máximo de puntos dibujados con marcadores, en curvas más largas solo se dibuja la línea
+MAX_MARCADORES = 200
 
-    if matriz_seleccionada in matrices:
-        
-        matriz_valores = matrices[matriz_seleccionada]
-
-        mag_1_1 = [np.abs(matriz[0, 0]) for matriz in matriz_valores]  # Magnitud de la posición (1,1)
-        mag_1_2 = [np.abs(matriz[0, 1]) for matriz in matriz_valores]  # Magnitud de la posición (1,2)
-        mag_2_1 = [np.abs(matriz[1, 0]) for matriz in matriz_valores]  # Magnitud de la posición (2,1)
-        mag_2_2 = [np.abs(matriz[1, 1]) for matriz in matriz_valores]  # Magnitud de la posición (2,2)
+#Función para reducir curvas a la resolución de la pantalla conservando sus picos
+def decimar_minmax(freq, valores, puntos):
+    """
+    Reduce E curvas de F puntos a unos 2 * puntos, guardando el mínimo y el máximo de cada intervalo.
     
-        # Crear la figura con subgráficos
-        fig, axs = plt.subplots(2, 2, figsize=(12, 10))
-        fig.suptitle('Magnitud vs Frecuencia para cada posición', fontsize=16)
-
-        # Graficar cada posición
-        axs[0, 0].plot(freq, mag_1_1, marker='o', label='Posición (1,1)')
-        axs[0, 0].set_title('Posición (1,1)')
-        axs[0, 0].set_xlabel('Frecuencia (Hz)')
-        axs[0, 0].set_ylabel('Magnitud')
-        axs[0, 0].legend()
-
-        axs[0, 1].plot(freq, mag_1_2, marker='o', label='Posición (1,2)')
-        axs[0, 1].set_title('Posición (1,2)')
-        axs[0, 1].set_xlabel('Frecuencia (Hz)')
-        axs[0, 1].set_ylabel('Magnitud')
-        axs[0, 1].legend()
-
-        axs[1, 0].plot(freq, mag_2_1, marker='o', label='Posición (2,1)')
-        axs[1, 0].set_title('Posición (2,1)')
-        axs[1, 0].set_xlabel('Frecuencia (Hz)')
-        axs[1, 0].set_ylabel('Magnitud')
-        axs[1, 0].legend()
-
-        axs[1, 1].plot(freq, mag_2_2, marker='o', label='Posición (2,2)')
-        axs[1, 1].set_title('Posición (2,2)')
-        axs[1, 1].set_xlabel('Frecuencia (Hz)')
-        axs[1, 1].set_ylabel('Magnitud')
-        axs[1, 1].legend()
-        
-        # Ajustar diseño para evitar superposición
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-        plt.show()
+    A diferencia de tomar un punto cada k, los picos y resonancias angostas se conservan.
+    Los NaN se ignoran, un intervalo sin valores queda en NaN.
+    
+    Args:
+        freq (numpy.ndarray): Frecuencias (F,), o (F, E) si cada curva tiene las suyas.
+        valores (numpy.ndarray): Valores reales (F, E) de las curvas.
+        puntos (int): Número de intervalos, normalmente el ancho en píxeles de la gráfica.
+    
+    Returns:
+        tuple: Frecuencias y valores decimados, ambos (M, E).
+    """
+    valores = np.asarray(valores, dtype=float)
+    F, E = valores.shape
+    freq = np.broadcast_to(np.asarray(freq, dtype=float).reshape(F, -1), (F, E))
+    if F <= 2 * puntos:
+        return freq, valores
+    
+    # Intervalos de k puntos, el último se completa con NaN
+    k = -(-F // puntos)
+    intervalos = -(-F // k)
+    if intervalos * k == F:
+        bloques = valores.reshape(intervalos, k, E)
     else:
-        ctk.CTkMessagebox.show_info("Error", "Selecciona una matriz válida")
-       
-# Función para graficar fase de las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz
-def plot_Phase(matriz_seleccionada, freq):
+        relleno = np.full((intervalos * k - F, E), np.nan)
+        bloques = np.concatenate([valores, relleno]).reshape(intervalos, k, E)
+    if np.isnan(bloques).any():
+        vacios = np.isnan(bloques)
+        minimos = np.where(vacios, np.inf, bloques).argmin(axis=1)
+        maximos = np.where(vacios, -np.inf, bloques).argmax(axis=1)
+    else:
+        minimos = bloques.argmin(axis=1)
+        maximos = bloques.argmax(axis=1)
     
-    if matriz_seleccionada in matrices:
-        
-        matriz_valores = matrices[matriz_seleccionada]
+    # Mínimo y máximo de cada intervalo en el orden en que aparecen
+    inicio = np.arange(intervalos)[:, np.newaxis] * k
+    indices = np.stack([inicio + np.minimum(minimos, maximos), inicio + np.maximum(minimos, maximos)], axis=1)
+    indices = np.minimum(indices.reshape(2 * intervalos, E), F - 1)
+    
+    return np.take_along_axis(freq, indices, axis=0), np.take_along_axis(valores, indices, axis=0)
+
+# Figuras abiertas por matriz y representación, se reutilizan en lugar de crear una nueva en cada gráfica
+figuras = {}
 
-        Phase_1_1 = [parameter2Phase(matriz[0, 0]) for matriz in matriz_valores]  # Fase de la posición (1,1)
-        Phase_1_2 = [parameter2Phase(matriz[0, 1]) for matriz in matriz_valores]  # Fase de la posición (1,2)
-        Phase_2_1 = [parameter2Phase(matriz[1, 0]) for matriz in matriz_valores]  # Fase de la posición (2,1)
-        Phase_2_2 = [parameter2Phase(matriz[1, 1]) for matriz in matriz_valores]  # Fase de la posición (2,2)
+#Clase para una figura de curvas que se actualiza en su lugar con blitting
+class FiguraCurvas:
+    """
+    Figura con un subgráfico por posición de una matriz de P puertos, que se reutiliza entre gráficas.
     
+    Las curvas son animadas: después de cada dibujo completo se guarda el fondo de la figura
+    (ejes, títulos y leyendas) y al cambiar los datos solo se restaura ese fondo y se dibujan
+    las curvas encima (blitting). La figura completa solo se vuelve a dibujar si cambian los límites.
+    En las gráficas polares las frecuencias son el radio y los valores el ángulo en radianes.
+    """
+
+    def __init__(self, puertos, titulo, etiqueta, polar=False):
         # Crear la figura con subgráficos
-        fig, axs = plt.subplots(2, 2, figsize=(12, 10))
-        fig.suptitle('Fase vs Frecuencia para cada posición', fontsize=16)
-
-        # Graficar cada posición
-        axs[0, 0].plot(freq, Phase_1_1, marker='o', label='Posición (1,1)')
-        axs[0, 0].set_title('Posición (1,1)')
-        axs[0, 0].set_xlabel('Frecuencia (Hz)')
-        axs[0, 0].set_ylabel('Fase')
-        axs[0, 0].legend()
-
-        axs[0, 1].plot(freq, Phase_1_2, marker='o', label='Posición (1,2)')
-        axs[0, 1].set_title('Posición (1,2)')
-        axs[0, 1].set_xlabel('Frecuencia (Hz)')
-        axs[0, 1].set_ylabel('Fase')
-        axs[0, 1].legend()
-
-        axs[1, 0].plot(freq, Phase_2_1, marker='o', label='Posición (2,1)')
-        axs[1, 0].set_title('Posición (2,1)')
-        axs[1, 0].set_xlabel('Frecuencia (Hz)')
-        axs[1, 0].set_ylabel('Fase')
-        axs[1, 0].legend()
-
-        axs[1, 1].plot(freq, Phase_2_2, marker='o', label='Posición (2,2)')
-        axs[1, 1].set_title('Posición (2,2)')
-        axs[1, 1].set_xlabel('Frecuencia (Hz)')
-        axs[1, 1].set_ylabel('Fase')
-        axs[1, 1].legend()
-        
+        if polar:
+            self.fig, self.axs = plt.subplots(puertos, puertos, subplot_kw={'projection': 'polar'}, figsize=(12, 12), squeeze=False)
+        else:
+            self.fig, self.axs = plt.subplots(puertos, puertos, figsize=(12, 10), squeeze=False)
+        self.fig.suptitle(titulo, fontsize=16)
+        self.puertos = puertos
+        self.polar = polar
+        self.fuente = None
+        self.fondo = None
+
+        # Una curva vacía por posición
+        self.lineas = []
+        for (m, n), ax in np.ndenumerate(self.axs):
+            posicion = f'Posición ({m + 1},{n + 1})'
+            linea, = ax.plot([], [], label=posicion, animated=True)
+            self.lineas.append(linea)
+            if polar:
+                ax.set_title(posicion, va='bottom')
+                ax.legend(loc='upper right')
+            else:
+                ax.set_title(posicion)
+                ax.set_xlabel('Frecuencia (Hz)')
+                ax.set_ylabel(etiqueta)
+                ax.legend()
+
         # Ajustar diseño para evitar superposición
         plt.tight_layout(rect=[0, 0, 1, 0.95])
-        plt.show()
+        self.canvas = self.fig.canvas
+        self.fig.canvas.mpl_connect('draw_event', self.__al_dibujar)
+
+    def abierta(self):
+        return plt.fignum_exists(self.fig.number)
+
+    def puntos(self):
+        """Un intervalo de decimación por píxel del ancho de cada subgráfico."""
+        return int(self.fig.get_figwidth() * self.fig.dpi / self.puertos)
+
+    def actualizar(self, freq, valores):
+        """Cambia los datos (M, P * P) de las curvas, con blitting si los límites de los ejes no cambian."""
+        marcador = 'o' if len(valores) <= MAX_MARCADORES else 'None'
+        limites = [(ax.get_xlim(), ax.get_ylim()) for ax in self.axs.flat]
+        for curva, (ax, linea) in enumerate(zip(self.axs.flat, self.lineas)):
+            if self.polar:
+                linea.set_data(valores[:, curva], freq[:, curva])
+            else:
+                linea.set_data(freq[:, curva], valores[:, curva])
+            linea.set_marker(marcador)
+            ax.relim()
+            ax.autoscale_view()
+
+        canvas = self.fig.canvas
+        if self.fondo is None or limites != [(ax.get_xlim(), ax.get_ylim()) for ax in self.axs.flat]:
+            canvas.draw()
+        else:
+            canvas.restore_region(self.fondo)
+            self.__dibujar_lineas()
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def mostrar(self):
+        """Muestra la figura sin bloquear la interfaz, o la trae al frente si ya estaba abierta."""
+        self.fig.canvas.manager.show()
+
+    def __al_dibujar(self, event):
+        # Al guardar (savefig) el lienzo es otro, solo se dibujan las curvas para que salgan en el archivo
+        if event.canvas is self.canvas and getattr(event.canvas, 'supports_blit', False) and not event.canvas.is_saving():
+            # Guarda el fondo sin las curvas animadas de la pantalla
+            self.fondo = event.canvas.copy_from_bbox(self.fig.bbox)
+        for linea in self.lineas:
+            linea.draw(event.renderer)
+
+    def __dibujar_lineas(self):
+        for ax, linea in zip(self.axs.flat, self.lineas):
+            ax.draw_artist(linea)
+
+#Función para graficar curvas (F, P * P) de cada posición de una matriz de P puertos
+def dibujar_curvas(freq, valores, puertos, titulo, etiqueta, polar=False, clave=None):
+    """
+    Dibuja cada posición en su subgráfico, decimada a la resolución de la figura.
+    
+    Si se da una clave, la figura se guarda en figuras y las siguientes gráficas con la misma
+    clave actualizan sus curvas en lugar de crear una figura nueva.
+    
+    Returns:
+        FiguraCurvas: La figura usada.
+    """
+    figura = figuras.get(clave)
+    if figura is None or not figura.abierta() or figura.puertos != puertos:
+        figura = FiguraCurvas(puertos, titulo, etiqueta, polar)
+        if clave is not None:
+            figuras[clave] = figura
+
+    freq, valores = decimar_minmax(freq, valores, figura.puntos())
+    figura.actualizar(freq, valores)
+    figura.mostrar()
+    return figura
+
+#Función para graficar una representación de todas las posiciones de un arreglo de matrices (F, P, P)
+def plot_matriz(matriz_valores, freq, representacion, titulo, etiqueta, polar=False, clave=None):
+    # Si la figura ya muestra estos mismos datos solo se trae al frente
+    figura = figuras.get(clave)
+    if figura is not None and figura.abierta() and figura.fuente is not None \
+            and figura.fuente[0] is matriz_valores and figura.fuente[1] is freq:
+        figura.mostrar()
+        return
+
+    # La representación se calcula de una vez para todo el arreglo
+    fuente = (matriz_valores, freq)
+    matriz_valores = np.asarray(matriz_valores)
+    frecuencias, puertos, _ = matriz_valores.shape
+    valores = representacion(matriz_valores).reshape(frecuencias, puertos * puertos)
+    
+    figura = dibujar_curvas(freq, valores, puertos, titulo, etiqueta, polar, clave)
+    if clave is not None:
+        figura.fuente = fuente
+
+#Función para graficar la matriz seleccionada si existe
+def plot_seleccionada(matriz_seleccionada, freq, representacion, titulo, etiqueta, polar=False):
+    if matriz_seleccionada in matrices:
+        plot_matriz(matrices[matriz_seleccionada], freq, representacion, titulo, etiqueta, polar,
+                    clave=(matriz_seleccionada, titulo))
     else:
         ctk.CTkMessagebox.show_info("Error", "Selecciona una matriz válida")
 
+# Función para graficar las magnitudes de las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz
+def plot_mag(matriz_seleccionada, freq):
+    plot_seleccionada(matriz_seleccionada, freq, np.abs, 'Magnitud vs Frecuencia para cada posición', 'Magnitud')
+       
+# Función para graficar fase de las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz
+def plot_Phase(matriz_seleccionada, freq):
+    plot_seleccionada(matriz_seleccionada, freq, parameter2Phase, 'Fase vs Frecuencia para cada posición', 'Fase')
+
 # Función para graficar dB de las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz
 def plot_dB(matriz_seleccionada, freq):
-    
-    if matriz_seleccionada in matrices:
-        
-        matriz_valores = matrices[matriz_seleccionada]
-
-        dB_1_1 = [parameter2dB(matriz[0, 0]) for matriz in matriz_valores]  
-        dB_1_2 = [parameter2dB(matriz[0, 1]) for matriz in matriz_valores]  
-        dB_2_1 = [parameter2dB(matriz[1, 0]) for matriz in matriz_valores]  
-        dB_2_2 = [parameter2dB(matriz[1, 1]) for matriz in matriz_valores]  
-
-        # Crear la figura con subgráficos
-        fig, axs = plt.subplots(2, 2, figsize=(12, 10))
-        fig.suptitle('dB vs Frecuencia para cada posición', fontsize=16)
-
-        # Graficar cada posición
-        axs[0, 0].plot(freq, dB_1_1, marker='o', label='Posición (1,1)')
-        axs[0, 0].set_title('Posición (1,1)')
-        axs[0, 0].set_xlabel('Frecuencia (Hz)')
-        axs[0, 0].set_ylabel('Fase')
-        axs[0, 0].legend()
-
-        axs[0, 1].plot(freq, dB_1_2, marker='o', label='Posición (1,2)')
-        axs[0, 1].set_title('Posición (1,2)')
-        axs[0, 1].set_xlabel('Frecuencia (Hz)')
-        axs[0, 1].set_ylabel('Fase')
-        axs[0, 1].legend()
-
-        axs[1, 0].plot(freq, dB_2_1, marker='o', label='Posición (2,1)')
-        axs[1, 0].set_title('Posición (2,1)')
-        axs[1, 0].set_xlabel('Frecuencia (Hz)')
-        axs[1, 0].set_ylabel('Fase')
-        axs[1, 0].legend()
-
-        axs[1, 1].plot(freq, dB_2_2, marker='o', label='Posición (2,2)')
-        axs[1, 1].set_title('Posición (2,2)')
-        axs[1, 1].set_xlabel('Frecuencia (Hz)')
-        axs[1, 1].set_ylabel('Fase')
-        axs[1, 1].legend()
-        
-        # Ajustar diseño para evitar superposición
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-        plt.show()
-    else:
-        ctk.CTkMessagebox.show_info("Error", "Selecciona una matriz válida")
+    plot_seleccionada(matriz_seleccionada, freq, parameter2dB, 'dB vs Frecuencia para cada posición', 'dB')
     
 # Función para graficar parte real de las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz
 def plot_real(matriz_seleccionada, freq):
-
-    
-    if matriz_seleccionada in matrices:
-        
-        matriz_valores = matrices[matriz_seleccionada]
-        
-        real_1_1 = [parameter2real(matriz[0, 0]) for matriz in matriz_valores]  
-        real_1_2 = [parameter2real(matriz[0, 1]) for matriz in matriz_valores]  
-        real_2_1 = [parameter2real(matriz[1, 0]) for matriz in matriz_valores]  
-        real_2_2 = [parameter2real(matriz[1, 1]) for matriz in matriz_valores]  
-
-        # Crear la figura con subgráficos
-        fig, axs = plt.subplots(2, 2, figsize=(12, 10))
-        fig.suptitle('Real vs Frecuencia para cada posición', fontsize=16)
-
-        # Graficar cada posición
-        axs[0, 0].plot(freq, real_1_1, marker='o', label='Posición (1,1)')
-        axs[0, 0].set_title('Posición (1,1)')
-        axs[0, 0].set_xlabel('Frecuencia (Hz)')
-        axs[0, 0].set_ylabel('Real')
-        axs[0, 0].legend()
-
-        axs[0, 1].plot(freq, real_1_2, marker='o', label='Posición (1,2)')
-        axs[0, 1].set_title('Posición (1,2)')
-        axs[0, 1].set_xlabel('Frecuencia (Hz)')
-        axs[0, 1].set_ylabel('Real')
-        axs[0, 1].legend()
-
-        axs[1, 0].plot(freq, real_2_1, marker='o', label='Posición (2,1)')
-        axs[1, 0].set_title('Posición (2,1)')
-        axs[1, 0].set_xlabel('Frecuencia (Hz)')
-        axs[1, 0].set_ylabel('Real')
-        axs[1, 0].legend()
-
-        axs[1, 1].plot(freq, real_2_2, marker='o', label='Posición (2,2)')
-        axs[1, 1].set_title('Posición (2,2)')
-        axs[1, 1].set_xlabel('Frecuencia (Hz)')
-        axs[1, 1].set_ylabel('Real')
-        axs[1, 1].legend()
-        
-        # Ajustar diseño para evitar superposición
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-        plt.show()
-    else:
-        ctk.CTkMessagebox.show_info("Error", "Selecciona una matriz válida")
+    plot_seleccionada(matriz_seleccionada, freq, parameter2real, 'Real vs Frecuencia para cada posición', 'Real')
 
 # Función para graficar parte imaginaria de las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz
 def plot_img(matriz_seleccionada, freq):
-
-    
-    if matriz_seleccionada in matrices:
-        
-        matriz_valores = matrices[matriz_seleccionada]
-        
-        img_1_1 = [parameter2img(matriz[0, 0]) for matriz in matriz_valores]  
-        img_1_2 = [parameter2img(matriz[0, 1]) for matriz in matriz_valores]  
-        img_2_1 = [parameter2img(matriz[1, 0]) for matriz in matriz_valores]  
-        img_2_2 = [parameter2img(matriz[1, 1]) for matriz in matriz_valores]  
-        
-        # Crear la figura con subgráficos
-        fig, axs = plt.subplots(2, 2, figsize=(12, 10))
-        fig.suptitle('Imaginario vs Frecuencia para cada posición', fontsize=16)
-
-        # Graficar cada posición
-        axs[0, 0].plot(freq, img_1_1, marker='o', label='Posición (1,1)')
-        axs[0, 0].set_title('Posición (1,1)')
-        axs[0, 0].set_xlabel('Frecuencia (Hz)')
-        axs[0, 0].set_ylabel('Imaginario')
-        axs[0, 0].legend()
-
-        axs[0, 1].plot(freq, img_1_2, marker='o', label='Posición (1,2)')
-        axs[0, 1].set_title('Posición (1,2)')
-        axs[0, 1].set_xlabel('Frecuencia (Hz)')
-        axs[0, 1].set_ylabel('Imaginario')
-        axs[0, 1].legend()
-
-        axs[1, 0].plot(freq, img_2_1, marker='o', label='Posición (2,1)')
-        axs[1, 0].set_title('Posición (2,1)')
-        axs[1, 0].set_xlabel('Frecuencia (Hz)')
-        axs[1, 0].set_ylabel('Imaginario')
-        axs[1, 0].legend()
-
-        axs[1, 1].plot(freq, img_2_2, marker='o', label='Posición (2,2)')
-        axs[1, 1].set_title('Posición (2,2)')
-        axs[1, 1].set_xlabel('Frecuencia (Hz)')
-        axs[1, 1].set_ylabel('Imaginario')
-        axs[1, 1].legend()
-        
-        # Ajustar diseño para evitar superposición
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-        plt.show()
-    else:
-        ctk.CTkMessagebox.show_info("Error", "Selecciona una matriz válida")
+    plot_seleccionada(matriz_seleccionada, freq, parameter2img, 'Imaginario vs Frecuencia para cada posición', 'Imaginario')
 
 # Función para graficar las fases de las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz en plano polar
 def plot_polar(matriz_seleccionada, freq):
-    
-    if matriz_seleccionada in matrices:
-        
-        matriz_valores = matrices[matriz_seleccionada]
-
-        fases_1_1 = [parameter2Phase(matriz[0, 0]) for matriz in matriz_valores]  # Fase de la posición (1,1)
-        fases_1_2 = [parameter2Phase(matriz[0, 1]) for matriz in matriz_valores]  # Fase de la posición (1,2)
-        fases_2_1 = [parameter2Phase(matriz[1, 0]) for matriz in matriz_valores]  # Fase de la posición (2,1)
-        fases_2_2 = [parameter2Phase(matriz[1, 1]) for matriz in matriz_valores]  # Fase de la posición (2,2)
- 
-    # Crear la figura con subgráficos polares
-    fig, axs = plt.subplots(2, 2, subplot_kw={'projection': 'polar'}, figsize=(12, 12))
-    fig.suptitle('Fases en Coordenadas Polares para cada Posición', fontsize=16)
-
-    # Graficar cada posición en su propio subgráfico
-    axs[0, 0].plot(fases_1_1, freq, marker='o', label='Posición (1,1)')
-    axs[0, 0].set_title('Posición (1,1)', va='bottom')
-    axs[0, 0].legend(loc='upper right')
-
-    axs[0, 1].plot(fases_1_2, freq, marker='o', label='Posición (1,2)')
-    axs[0, 1].set_title('Posición (1,2)', va='bottom')
-    axs[0, 1].legend(loc='upper right')
-
-    axs[1, 0].plot(fases_2_1, freq, marker='o', label='Posición (2,1)')
-    axs[1, 0].set_title('Posición (2,1)', va='bottom')
-    axs[1, 0].legend(loc='upper right')
-
-    axs[1, 1].plot(fases_2_2, freq, marker='o', label='Posición (2,2)')
-    axs[1, 1].set_title('Posición (2,2)', va='bottom')
-    axs[1, 1].legend(loc='upper right')
-
-    # Ajustar el diseño para evitar superposición
-    plt.tight_layout(rect=[0, 0, 1, 0.95])
-    plt.show()
+    # Los ejes polares esperan el ángulo en radianes
+    plot_seleccionada(matriz_seleccionada, freq, np.angle, 'Fases en Coordenadas Polares para cada Posición', 'Fase', polar=True)
 
 # Función para graficar las posiciones (1,1), (1,2), (2,1) y (2,2) de cada matriz en Carta de Smith
 def plot_smith(matriz_seleccionada, freq):
@@ -487,6 +608,37 @@ def plot_smith(matriz_seleccionada, freq):
         # Mostrar mensaje de error si la matriz seleccionada no es válida
         ctk.CTkMessagebox.show_info("Error", "Selecciona una matriz válida")
 
+# Función para graficar por bloques las posiciones de cada matriz, por ejemplo de read_s2p_bloques
+def plot_bloques(bloques, representacion, titulo, etiqueta, puntos=4096):
+    """
+    Grafica una secuencia de bloques (freq, matrices, z_ref) con memoria acotada.
+    
+    Cada bloque se convierte con representacion (np.abs, parameter2dB, parameter2Phase,
+    parameter2real o parameter2img), se decima a puntos intervalos y se agrega a un solo
+    arreglo decimado, que se vuelve a decimar cuando pasa de 4 * puntos. Así la memoria es
+    O(puntos) sin importar el tamaño del archivo.
+    
+    Returns:
+        FiguraCurvas: La figura usada.
+    """
+    freq_decimada = None
+    valores_decimados = None
+    puertos = None
+    for freq, matrices_bloque, _ in bloques:
+        frecuencias, puertos, _ = matrices_bloque.shape
+        freq, valores_bloque = decimar_minmax(freq, representacion(matrices_bloque).reshape(frecuencias, -1), puntos)
+        if freq_decimada is None:
+            freq_decimada, valores_decimados = freq, valores_bloque
+        else:
+            freq_decimada = np.concatenate([freq_decimada, freq])
+            valores_decimados = np.concatenate([valores_decimados, valores_bloque])
+        if len(valores_decimados) > 4 * puntos:
+            freq_decimada, valores_decimados = decimar_minmax(freq_decimada, valores_decimados, puntos)
+
+    if puertos is None:
+        raise ValueError("No hay bloques para graficar")
+    return dibujar_curvas(freq_decimada, valores_decimados, puertos, titulo, etiqueta)
+
 #Función selectora para graficar
 def graficar():
     try:
@@ -524,7 +676,7 @@ def graficar():
                 plot_mag(sel_mat_i, freq_plot)
             elif sel_plot_i == "Fase vs Frecuencia":
                 plot_Phase(sel_mat_i, freq_plot) 
-            elif sel_plot_i == "db vs Frecuencia":
+            elif sel_plot_i == "dB vs Frecuencia":
                 plot_dB(sel_mat_i, freq_plot)
             elif sel_plot_i == "Real vs Frecuencia":
                 plot_real(sel_mat_i, freq_plot)
@@ -543,7 +695,7 @@ def graficar():
                 plot_mag(sel_mat_i, freq_plot)
             elif sel_plot_i == "Fase vs Frecuencia":
                 plot_Phase(sel_mat_i, freq_plot) 
-            elif sel_plot_i == "db vs Frecuencia":
+            elif sel_plot_i == "dB vs Frecuencia":
                 plot_dB(sel_mat_i, freq_plot)
             elif sel_plot_i == "Real vs Frecuencia":
                 plot_real(sel_mat_i, freq_plot)
@@ -562,7 +714,7 @@ def graficar():
                 plot_mag(sel_mat_i, freq_plot)
             elif sel_plot_i == "Fase vs Frecuencia":
                 plot_Phase(sel_mat_i, freq_plot) 
-            elif sel_plot_i == "db vs Frecuencia":
+            elif sel_plot_i == "dB vs Frecuencia":
                 plot_dB(sel_mat_i, freq_plot)
             elif sel_plot_i == "Real vs Frecuencia":
                 plot_real(sel_mat_i, freq_plot)
@@ -581,7 +733,7 @@ def graficar():
                 plot_mag(sel_mat_i, freq_plot)
             elif sel_plot_i == "Fase vs Frecuencia":
                 plot_Phase(sel_mat_i, freq_plot) 
-            elif sel_plot_i == "db vs Frecuencia":
+            elif sel_plot_i == "dB vs Frecuencia":
                 plot_dB(sel_mat_i, freq_plot)
             elif sel_plot_i == "Real vs Frecuencia":
                 plot_real(sel_mat_i, freq_plot)
@@ -602,60 +754,90 @@ def graficar():
         messagebox.showerror("Error", f"Hubo un error al graficar: {e}")
 
 
-# Lista de frecuencias
-frecuencias = [1e6, 5e6, 10e6, 50e6, 100e6]  # Frecuencias en Hz
-
-# Diccionario de matrices dependientes de frecuencia
-matrices = {
-    "Z": [np.array([[1 + 1j * f, 2 + 0.5j * f], [3 - 0.5j * f, 4 + 1j * f]]) for f in frecuencias],
-    "Y": [np.array([[0.5 - 0.2j * f, 1.5 + 0.3j * f], [-0.5 + 0.7j * f, 0.7 - 0.4j * f]]) for f in frecuencias],
-    "ABCD": [np.array([[2 + 0.5j * f, 1 - 0.3j * f], [-1 + 0.2j * f, 3 - 0.6j * f]]) for f in frecuencias],
-    "S": [np.array([[2 + 0.5j * f, 1 - 0.3j * f], [-1 + 0.2j * f, 3 - 0.6j * f]]) for f in frecuencias],
-}
-
-#Archivo s2p
-filename = 'Line.s2p'
-s2p_freq, s2p_params, z_ref = read_s2p(filename)
+# Matrices que se muestran y sus frecuencias, las carga mostrar_resultados
+frecuencias = []
+matrices = {}
 
-#Agregar archivo s2p al diccionario de matrices
-matrices['Archivo S2P'] = s2p_params
-
-# Configuración de customtkinter
-ctk.set_appearance_mode("Dark")  # Modo de apariencia: "Light", "Dark", "System"
-ctk.set_default_color_theme("dark-blue")  # Tema de color: "blue", "green", "dark-blue"
-
-# Crear la ventana principal
-ventana_4 = ctk.CTk()
-ventana_4.title("Resultados")
-ventana_4.geometry("400x300")
-
-# Etiqueta informativa
-etiqueta = ctk.CTkLabel(ventana_4, text="Selecciona una matriz y la acción que desea realizar. Si desea graficar, seleccione también el tipo de gráfica")
-etiqueta.pack(pady=10)
+#Función para crear la ventana de resultados
+def crear_ventana(maestra=None):
+    """Crea la ventana de resultados, como ventana secundaria de maestra si se da."""
+    global ventana_4, combobox_matrices, sel_plot
+    
+    # Crear la ventana principal
+    ventana_4 = ctk.CTk() if maestra is None else ctk.CTkToplevel(maestra)
+    ventana_4.title("Resultados")
+    ventana_4.geometry("400x300")
 
-# Combobox para seleccionar la matriz
-combobox_matrices = ctk.CTkComboBox(ventana_4, values=list(matrices.keys()))
-combobox_matrices.set(list(matrices.keys())[0])  # Seleccionar la primera opción por defecto
-combobox_matrices.pack(pady=10)
+    # Etiqueta informativa
+    etiqueta = ctk.CTkLabel(ventana_4, text="Selecciona una matriz y la acción que desea realizar. Si desea graficar, seleccione también el tipo de gráfica")
+    etiqueta.pack(pady=10)
 
-# Crear un combobox (selector) para elegir el tipo de gráfica
-sel_plot = ctk.CTkComboBox(
-    ventana_4,
-    values=["Magnitud vs Frecuencia", "Fase vs Frecuencia", 
-            "dB vs Frecuencia", "Real vs Frecuencia", 
-            "Imaginario vs Frecuencia", "Gráfica Polar", "Carta de Smith"]
-)
-sel_plot.set("Magnitud vs Frecuencia")  # Valor predeterminado
-sel_plot.pack(pady=10)
+    # Combobox para seleccionar la matriz
+    combobox_matrices = ctk.CTkComboBox(ventana_4, values=list(matrices.keys()))
+    combobox_matrices.set(list(matrices.keys())[0])  # Seleccionar la primera opción por defecto
+    combobox_matrices.pack(pady=10)
 
-# Botón para graficar
-boton_graficar = ctk.CTkButton(ventana_4, text="Graficar", command=graficar)
-boton_graficar.pack(pady=20)
+    # Crear un combobox (selector) para elegir el tipo de gráfica
+    sel_plot = ctk.CTkComboBox(
+        ventana_4,
+        values=["Magnitud vs Frecuencia", "Fase vs Frecuencia", 
+                "dB vs Frecuencia", "Real vs Frecuencia", 
+                "Imaginario vs Frecuencia", "Gráfica Polar", "Carta de Smith"]
+    )
+    sel_plot.set("Magnitud vs Frecuencia")  # Valor predeterminado
+    sel_plot.pack(pady=10)
 
-# Botón para mostrar la matriz seleccionada
-boton_mostrar = ctk.CTkButton(ventana_4, text="Mostrar Matriz", command=mostrar)
-boton_mostrar.pack(pady=20)
+    # Botón para graficar
+    boton_graficar = ctk.CTkButton(ventana_4, text="Graficar", command=graficar)
+    boton_graficar.pack(pady=20)
 
-# Iniciar la GUI
-ventana_4.mainloop()
+    # Botón para mostrar la matriz seleccionada
+    boton_mostrar = ctk.CTkButton(ventana_4, text="Mostrar Matriz", command=mostrar)
+    boton_mostrar.pack(pady=20)
+    
+    return ventana_4
 
+#Función para mostrar los resultados de una simulación
+def mostrar_resultados(resultado, maestra=None):
+    """
+    Carga las matrices de un resultado de Circuit.run_simulation y abre la ventana de resultados.
+    
+    Args:
+        resultado (SweepResult): Resultado de la simulación.
+        maestra: Ventana desde la que se abre, si no se da se crea una ventana principal.
+    
+    Returns:
+        La ventana de resultados.
+    """
+    global frecuencias, matrices
+    frecuencias = resultado.frequencies
+    matrices = {nombre: resultado[nombre] for nombre in ["Z", "Y", "ABCD", "S"] if nombre in resultado}
+    return crear_ventana(maestra)
+
+
+if __name__ == "__main__":
+    # Lista de frecuencias
+    frecuencias = [1e6, 5e6, 10e6, 50e6, 100e6]  # Frecuencias en Hz
+
+    # Diccionario de matrices dependientes de frecuencia
+    matrices = {
+        "Z": [np.array([[1 + 1j * f, 2 + 0.5j * f], [3 - 0.5j * f, 4 + 1j * f]]) for f in frecuencias],
+        "Y": [np.array([[0.5 - 0.2j * f, 1.5 + 0.3j * f], [-0.5 + 0.7j * f, 0.7 - 0.4j * f]]) for f in frecuencias],
+        "ABCD": [np.array([[2 + 0.5j * f, 1 - 0.3j * f], [-1 + 0.2j * f, 3 - 0.6j * f]]) for f in frecuencias],
+        "S": [np.array([[2 + 0.5j * f, 1 - 0.3j * f], [-1 + 0.2j * f, 3 - 0.6j * f]]) for f in frecuencias],
+    }
+
+    #Archivo s2p
+    filename = 'Line.s2p'
+    s2p_freq, s2p_params, z_ref = read_s2p(filename)
+
+    #Agregar archivo s2p al diccionario de matrices
+    matrices['Archivo S2P'] = s2p_params
+
+    # Configuración de customtkinter
+    ctk.set_appearance_mode("Dark")  # Modo de apariencia: "Light", "Dark", "System"
+    ctk.set_default_color_theme("dark-blue")  # Tema de color: "blue", "green", "dark-blue"
+
+    # Iniciar la GUI
+    ventana_4 = crear_ventana()
+    ventana_4.mainloop()
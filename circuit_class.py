@@ -1,8 +1,796 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
+import touchstone
+import z2param
+
+try:
+    from scipy import sparse
+    from scipy.sparse import linalg as sparse_linalg
+except ImportError:
+    sparse = None
+
+RELATIVE_PERMITIVITY = 4.6 # Relative permitivity of the substrate FR4
+LIGHT_SPEED = 3e8
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "circuit2parameters")
+PROGRESS_STEPS = 100 # Chunks of a serial sweep that reports its progress
+
+def frequency_grid(lower_freq_limit: float, upper_freq_limit: float, freq_step: float = None,
+                   points_per_decade: float = None) -> np.ndarray:
+    """Build the frequencies of a sweep up front, without accumulating rounding errors.
+
+    Every frequency is calculated from its index, lower + k * freq_step for linear sweeps or
+    lower * 10^(k / points_per_decade) for logarithmic ones. upper_freq_limit is included when
+    it falls on the grid, even if rounding puts the last point slightly above it.
+
+    Args:
+        lower_freq_limit (float): First frequency of the sweep.
+        upper_freq_limit (float): Last frequency allowed in the sweep.
+        freq_step (float, optional): Step of a linear sweep.
+        points_per_decade (float, optional): Points in every decade of a logarithmic sweep, used instead of freq_step.
+
+    Returns:
+        np.ndarray: Frequencies of the sweep in ascending order.
+    """
+    if points_per_decade is not None:
+        if lower_freq_limit <= 0 or points_per_decade <= 0:
+            raise ValueError("Logarithmic sweeps need a positive lower_freq_limit and points_per_decade")
+        steps = np.log10(upper_freq_limit / lower_freq_limit) * points_per_decade
+        frequencies = lower_freq_limit * 10 ** (np.arange(int(np.floor(steps + 1e-9)) + 1) / points_per_decade)
+    else:
+        if not freq_step or freq_step <= 0:
+            raise ValueError("Linear sweeps need a positive freq_step")
+        steps = (upper_freq_limit - lower_freq_limit) / freq_step
+        frequencies = lower_freq_limit + freq_step * np.arange(max(int(np.floor(steps + 1e-9)) + 1, 0))
+
+    # The last point may be upper_freq_limit with a rounding error
+    if len(frequencies) and np.isclose(frequencies[-1], upper_freq_limit, rtol=1e-9, atol=0):
+        frequencies[-1] = upper_freq_limit
+    return frequencies
+
+def kron_reduction(circuit_matrix: np.ndarray, in_nodes: list) -> np.ndarray:
+    """Reduce a (F, N, N) stack of nodal admittance matrices to its input nodes.
+
+    The internal nodes are eliminated with the Schur complement Y_pp - Y_pi * Y_ii^-1 * Y_ip,
+    using one batched linear solve for every frequency.
+
+    Args:
+        circuit_matrix (np.ndarray): (F, N, N) nodal admittance matrices.
+        in_nodes (list): Rows of the input nodes, in the order of the ports.
+
+    Returns:
+        np.ndarray: (F, P, P) admittance matrices seen from the input nodes.
+    """
+    in_nodes = np.asarray(in_nodes, dtype=int)
+    no_in_nodes = np.setdiff1d(np.arange(circuit_matrix.shape[-1]), in_nodes)
+
+    y_pp = circuit_matrix[..., in_nodes[:, np.newaxis], in_nodes]
+    if len(no_in_nodes) == 0:
+        return y_pp
+
+    y_pi = circuit_matrix[..., in_nodes[:, np.newaxis], no_in_nodes]
+    y_ip = circuit_matrix[..., no_in_nodes[:, np.newaxis], in_nodes]
+    y_ii = circuit_matrix[..., no_in_nodes[:, np.newaxis], no_in_nodes]
+
+    return y_pp - y_pi @ z2param.batched_solve(y_ii, y_ip)
+
+def topology_hash(components: list, input_nodes: list) -> str:
+    """Hash of the topology of a netlist, the nodes of every component and the input nodes.
+
+    Nodes are hashed sorted, so the order of the terminals of a component does not matter,
+    but the order of the components does, since plans and results refer to them by index.
+    """
+    netlist = {"components": [sorted(int(node) for node in nodes) for _, _, *nodes in components],
+               "input_nodes": [int(node) for node in input_nodes]}
+    return hashlib.sha256(json.dumps(netlist).encode()).hexdigest()
+
+def netlist_hash(components: list, input_nodes: list, z_charac: float, frequencies: np.ndarray) -> str:
+    """Hash of everything a sweep result depends on: the netlist with its values, the
+    input nodes, the characteristic impedance and the exact frequency grid."""
+
+    netlist = {"components": [[type_, float(value), sorted(int(node) for node in nodes)] for type_, value, *nodes in components],
+               "input_nodes": [int(node) for node in input_nodes],
+               "z_charac": repr(complex(z_charac))}
+    digest = hashlib.sha256(json.dumps(netlist).encode())
+    digest.update(np.ascontiguousarray(frequencies, dtype="<f8").tobytes())
+    return digest.hexdigest()
+
+class ReductionPlan:
+    """Series/parallel merge sequence of a circuit topology.
+
+    The plan is recorded once from the components nodes and replayed over the
+    impedances of a whole frequency sweep with array operations.
+    """
+
+    def __init__(self, steps: list, survivors: list, components_nodes: list):
+        self.steps = steps
+        self.survivors = survivors
+        self.components_nodes = components_nodes
+
+    def apply(self, impedances: np.ndarray) -> np.ndarray:
+        """Reduce (n_components, ...) impedances to the (n_equivalent, ...) equivalent circuit ones."""
+
+        values = np.array(impedances, dtype=complex)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for kind, components in self.steps:
+                if kind == "serial":
+                    values[components[-1]] = values[components].sum(axis=0)
+                else:
+                    values[components[-1]] = 1 / (1 / values[components]).sum(axis=0)
+
+        return values[self.survivors]
+
+    def to_dict(self) -> dict:
+        """JSON friendly form of the plan."""
+
+        return {"steps": [[kind, components.tolist()] for kind, components in self.steps],
+                "survivors": [int(component) for component in self.survivors],
+                "components_nodes": [[int(node) for node in nodes] for nodes in self.components_nodes]}
+
+    @classmethod
+    def from_dict(cls, plan: dict) -> "ReductionPlan":
+        steps = [(kind, np.array(components, dtype=int)) for kind, components in plan["steps"]]
+        return cls(steps, plan["survivors"], plan["components_nodes"])
+
+class ReductionEngine:
+    """Incremental series/parallel reduction of a circuit topology.
+
+    The engine keeps a node to components index and a terminals to components index,
+    both updated in place after every merge. Only the nodes touched by a merge are
+    checked again for new series or parallel branches, so the whole reduction costs
+    about the size of the netlist. The merges are recorded as a ReductionPlan.
+    """
+
+    def __init__(self, components_nodes: list, input_nodes: list):
+        self._input_nodes = set(input_nodes)
+        self._nodes = {component: sorted(nodes) for component, nodes in enumerate(components_nodes)}
+        self._node_components = {}
+        self._degree = Counter()
+        self._terminals = {}
+        self._parallel = set()
+        self._steps = []
+
+        for component in self._nodes:
+            self.__link(component)
+        self._serial = {node for node in self._node_components if self.__is_serial(node)}
+
+    def __link(self, component: int):
+        """Add a component to the indexes."""
+
+        nodes = self._nodes[component]
+        for node in nodes:
+            self._degree[node] += 1
+            self._node_components.setdefault(node, set()).add(component)
+        if nodes:
+            terminals = self._terminals.setdefault(tuple(nodes), set())
+            terminals.add(component)
+            if len(terminals) > 1:
+                self._parallel.add(tuple(nodes))
+
+    def __unlink(self, component: int):
+        """Remove a component from the indexes."""
+
+        nodes = self._nodes[component]
+        for node in nodes:
+            self._degree[node] -= 1
+            self._node_components[node].discard(component)
+            if not self._degree[node]:
+                del self._degree[node]
+                del self._node_components[node]
+        if nodes:
+            terminals = self._terminals[tuple(nodes)]
+            terminals.discard(component)
+            if len(terminals) < 2:
+                self._parallel.discard(tuple(nodes))
+            if not terminals:
+                del self._terminals[tuple(nodes)]
+
+    def __is_serial(self, node) -> bool:
+        """A node joins two components in series if only they use it and it is not an input node."""
+
+        return (self._degree.get(node) == 2 and node not in self._input_nodes
+                and len(self._node_components[node]) == 2)
+
+    def __refresh(self, nodes: list):
+        """Check again if the nodes touched by a merge join components in series."""
+
+        for node in nodes:
+            if node in self._node_components and self.__is_serial(node):
+                self._serial.add(node)
+            else:
+                self._serial.discard(node)
+
+    def __parallel_sum(self, terminals: tuple):
+        """Merge every component between the same terminals into the last one."""
+
+        components = sorted(self._terminals.get(terminals, ()))
+        if len(components) < 2:
+            return
+        self._steps.append(("parallel", np.array(components)))
+        for component in components[:-1]:
+            self.__unlink(component)
+            del self._nodes[component]
+        self.__refresh(terminals)
+
+    def __serial_sum(self, node):
+        """Merge the whole serial chain that goes through a node into its last component."""
+
+        chain, seen_components, seen_nodes, pending = [], set(), {node}, [node]
+        while pending:
+            for component in self._node_components[pending.pop()]:
+                if component in seen_components:
+                    continue
+                seen_components.add(component)
+                chain.append(component)
+                for other in self._nodes[component]:
+                    if other not in seen_nodes and self.__is_serial(other):
+                        seen_nodes.add(other)
+                        pending.append(other)
+
+        chain.sort()
+        nodes_count = Counter(node for component in chain for node in self._nodes[component])
+        self._steps.append(("serial", np.array(chain)))
+        for component in chain:
+            self.__unlink(component)
+        for component in chain[:-1]:
+            del self._nodes[component]
+        self._nodes[chain[-1]] = sorted(node for node, count in nodes_count.items() if count == 1)
+        self.__link(chain[-1])
+        self.__refresh(nodes_count)
+
+    def compile(self) -> ReductionPlan:
+        """Merge parallel branches first and serial chains after, until none is left."""
+
+        while self._parallel or self._serial:
+            if self._parallel:
+                self.__parallel_sum(self._parallel.pop())
+            else:
+                node = self._serial.pop()
+                if node in self._node_components and self.__is_serial(node):
+                    self.__serial_sum(node)
+
+        survivors = sorted(self._nodes)
+        return ReductionPlan(self._steps, survivors, [self._nodes[component] for component in survivors])
+
+class NodeIndex:
+    """Bidirectional node <-> component index of a topology.
+
+    The circuit nodes are renumbered densely as the rows of the circuit matrix, in
+    ascending order. Input nodes always get a row, even if no component uses them.
+    """
+
+    def __init__(self, components_nodes: list, input_nodes: list):
+        self.nodes = sorted({node for component_nodes in components_nodes for node in component_nodes} | set(input_nodes))
+        self.rows = {node: row for row, node in enumerate(self.nodes)}
+        self.in_nodes = [self.rows[node] for node in sorted(set(input_nodes))]
+        self.component_rows = [[self.rows[node] for node in component_nodes] for component_nodes in components_nodes]
+        self.node_components = [[] for _ in self.nodes]
+        for component, rows in enumerate(self.component_rows):
+            for row in dict.fromkeys(rows):
+                self.node_components[row].append(component)
+
+    def nodes_of(self, rows: list) -> list:
+        """Circuit node numbers of the given matrix rows."""
+
+        return [self.nodes[row] for row in rows]
+
+    def other_row(self, component: int, row: int) -> int:
+        """Row of the other terminal of a component, -1 if it is grounded or both terminals are the same node."""
+
+        rows = self.component_rows[component]
+        if len(rows) != 2:
+            return -1
+        other = rows[1] if rows[0] == row else rows[0]
+        return -1 if other == row else other
+
+class AdmittanceAssembler:
+    """Nodal admittance matrix assembler built on a node-branch incidence.
+
+    The stamp positions of every branch are computed once from the node index,
+    so filling the matrices of a whole sweep is a scatter-add over the branches.
+    One-terminal components are connected to ground and only stamp their own node.
+    """
+
+    def __init__(self, node_index: NodeIndex):
+        self.nodes = node_index.nodes
+        self.in_nodes = node_index.in_nodes
+
+        size = len(self.nodes)
+        branches, positions, signs = [], [], []
+        for branch, terminals in enumerate(node_index.component_rows):
+            if len(terminals) > 2:
+                raise ValueError(f"Component {branch} has more than two terminals: {node_index.nodes_of(terminals)}")
+            for i, row in enumerate(terminals):
+                for j, col in enumerate(terminals):
+                    branches.append(branch)
+                    positions.append(row * size + col)
+                    signs.append(1 if i == j else -1)
+
+        order = np.argsort(positions, kind="stable")
+        self._branches = np.array(branches, dtype=int)[order]
+        self._signs = np.array(signs, dtype=float)[order, np.newaxis]
+        self._positions, self._starts = np.unique(np.array(positions, dtype=int)[order], return_index=True)
+
+    @property
+    def positions(self) -> tuple:
+        """Rows and columns of the nonzero entries of the nodal admittance matrix."""
+
+        return np.divmod(self._positions, len(self.nodes))
+
+    def stamp(self, impedances: np.ndarray) -> np.ndarray:
+        """Sum the (n_branches, ...) impedances into the (n_nonzero, ...) nonzero entries."""
+
+        if not len(self._branches):
+            return np.zeros((0,) + impedances.shape[1:], dtype=complex)
+        signs = self._signs.reshape((-1,) + (1,) * (impedances.ndim - 1))
+        with np.errstate(divide="ignore"):
+            stamps = signs / impedances[self._branches]
+        return np.add.reduceat(stamps, self._starts, axis=0)
+
+    def assemble(self, impedances: np.ndarray) -> np.ndarray:
+        """Stamp (n_branches, ...) impedances into (..., N, N) nodal admittance matrices.
+
+        The trailing axes are usually (n_freq,), or (n_samples, n_freq) for value sweeps.
+        """
+
+        size = len(self.nodes)
+        circuit_matrix = np.zeros(impedances.shape[1:] + (size * size,), dtype=complex)
+        circuit_matrix[..., self._positions] = np.moveaxis(self.stamp(impedances), 0, -1)
+
+        return circuit_matrix.reshape(impedances.shape[1:] + (size, size))
+
+class SparseNodalSolver:
+    """Sparse port extraction for large circuits, using scipy sparse LU.
+
+    The nodal admittance matrix is split once in its input and internal blocks. The
+    internal block is kept in CSC format and its fill-reducing column ordering, found
+    with the first frequency, is reused to factorize the rest of the sweep.
+    """
+
+    def __init__(self, assembler: AdmittanceAssembler):
+        if sparse is None:
+            raise ImportError("The sparse backend needs scipy installed")
+
+        self._assembler = assembler
+        size = len(assembler.nodes)
+        in_nodes = np.asarray(assembler.in_nodes, dtype=int)
+        no_in_nodes = np.setdiff1d(np.arange(size), in_nodes)
+        self._ports = len(in_nodes)
+        self._internal = len(no_in_nodes)
+
+        # Position of every node inside its block
+        block_row = np.empty(size, dtype=int)
+        block_row[in_nodes] = np.arange(len(in_nodes))
+        block_row[no_in_nodes] = np.arange(len(no_in_nodes))
+        is_port = np.zeros(size, dtype=bool)
+        is_port[in_nodes] = True
+
+        rows, cols = assembler.positions
+        entries = np.arange(len(rows))
+        self._blocks = {}
+        for name, row_mask, col_mask in (("pp", is_port[rows], is_port[cols]),
+                                         ("pi", is_port[rows], ~is_port[cols]),
+                                         ("ip", ~is_port[rows], is_port[cols]),
+                                         ("ii", ~is_port[rows], ~is_port[cols])):
+            mask = row_mask & col_mask
+            self._blocks[name] = (entries[mask], block_row[rows[mask]], block_row[cols[mask]])
+
+        self._perm_c = None
+        self._ii_template = self.__template()
+
+    def __template(self, perm_c: np.ndarray = None) -> tuple:
+        """CSC structure of the internal block, with its columns ordered by perm_c if given."""
+
+        entries, rows, cols = self._blocks["ii"]
+        # The data tracks which nonzero entry ends in every CSC position
+        tracker = sparse.csc_matrix((entries + 1.0, (rows, cols)), shape=(self._internal, self._internal))
+        if perm_c is not None:
+            tracker = tracker[:, perm_c].tocsc()
+        tracker.sort_indices()
+        return tracker.data.astype(int) - 1, tracker.indices, tracker.indptr
+
+    def __internal_block(self, values: np.ndarray):
+        """Build the CSC internal block for the nonzero entries of one frequency."""
+
+        data, indices, indptr = self._ii_template
+        return sparse.csc_matrix((values[data], indices, indptr), shape=(self._internal, self._internal))
+
+    def solve(self, impedances: np.ndarray) -> np.ndarray:
+        """Calculate the (n_freq, P, P) Y matrices of the input nodes for (n_branches, n_freq) impedances."""
+
+        stamps = self._assembler.stamp(impedances)
+        n_freq = impedances.shape[1]
+        y_matrix = np.zeros((n_freq, self._ports, self._ports), dtype=complex)
+        entries, rows, cols = self._blocks["pp"]
+        np.add.at(y_matrix, (slice(None), rows, cols), stamps[entries].T)
+        if self._internal == 0:
+            return y_matrix
+
+        y_pi = np.zeros((self._ports, self._internal), dtype=complex)
+        y_ip = np.zeros((self._internal, self._ports), dtype=complex)
+        for k in range(n_freq):
+            values = stamps[:, k]
+            y_pi[:] = 0
+            y_ip[:] = 0
+            entries, rows, cols = self._blocks["pi"]
+            y_pi[rows, cols] = values[entries]
+            entries, rows, cols = self._blocks["ip"]
+            y_ip[rows, cols] = values[entries]
+
+            try:
+                if self._perm_c is None:
+                    lu = sparse_linalg.splu(self.__internal_block(values))
+                    solution = lu.solve(y_ip)
+                    self._perm_c = lu.perm_c.copy()
+                    self._ii_template = self.__template(self._perm_c)
+                else:
+                    lu = sparse_linalg.splu(self.__internal_block(values), permc_spec="NATURAL")
+                    solution = np.empty_like(y_ip)
+                    solution[self._perm_c] = lu.solve(y_ip)
+            except RuntimeError:
+                # Singular internal block at this frequency
+                y_matrix[k] = np.nan
+                continue
+
+            y_matrix[k] -= y_pi @ solution
+
+        return y_matrix
+
+class SweepResult:
+    """Columnar result of a frequency sweep.
+
+    The frequencies are stored once and every parameter set as one contiguous
+    (F, P, P) complex array. Only the given parameter sets are stored up front, the
+    rest are converted from Y the first time they are asked for and then cached.
+    """
+
+    CONVERSIONS = {"Z": z2param.y2z, "ABCD": z2param.y2abcd, "S": z2param.y2s}
+    MAGIC = b"C2PSWEEP"
+    VERSION = 1
+    ALIGNMENT = 64
+
+    def __init__(self, frequencies: np.ndarray, parameters: dict, z_charac: float, ports: list = None,
+                 netlist_hash: str = None):
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.z_charac = z_charac
+        self.ports = ports
+        self.netlist_hash = netlist_hash
+        self._parameters = dict(parameters)
+
+    def __len__(self) -> int:
+        return len(self.frequencies)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.keys()
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Return the (F, P, P) array of a parameter set, without copying it."""
+        if name not in self._parameters and name in self.CONVERSIONS:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self._parameters[name] = self.CONVERSIONS[name](self._parameters["Y"], self.z_charac)
+        return self._parameters[name]
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "SweepResult(0 frequencies)"
+        names = ", ".join(self.keys())
+        return (f"SweepResult({len(self)} frequencies from {self.frequencies[0]:g} Hz "
+                f"to {self.frequencies[-1]:g} Hz, ports={self.ports}, parameters=[{names}])")
+
+    def keys(self) -> list:
+        """Names of the parameter sets of the result, computed or not yet."""
+        names = [name for name, values in self._parameters.items() if values is not None]
+        if "Y" in self._parameters:
+            ports = self._parameters["Y"].shape[-1]
+            names += [name for name in self.CONVERSIONS
+                      if name not in self._parameters and (name != "ABCD" or ports == 2)]
+        order = ["Y", "Z", "ABCD", "S"]
+        return sorted(names, key=lambda name: order.index(name) if name in order else len(order))
+
+    def entry(self, name: str, row: int, col: int) -> np.ndarray:
+        """Return the (F,) view of one entry of a parameter set, e.g. entry("S", 1, 0) for S21."""
+        return self[name][:, row, col]
+
+    def nearest(self, frecuency: float) -> int:
+        """Index of the frequency of the sweep closest to the given one, found by bisection."""
+        index = int(np.searchsorted(self.frequencies, frecuency))
+        if index == len(self):
+            return index - 1
+        if index > 0 and frecuency - self.frequencies[index - 1] <= self.frequencies[index] - frecuency:
+            return index - 1
+        return index
+
+    def at(self, frecuency: float) -> dict:
+        """Matrices of every parameter set at the frequency of the sweep closest to the given one."""
+        index = self.nearest(frecuency)
+        return {name: self[name][index] for name in self.keys()}
+
+    def select(self, lower_freq: float = None, upper_freq: float = None) -> "SweepResult":
+        """Return the frequencies in [lower_freq, upper_freq] as a result sharing memory with this one."""
+        start = 0 if lower_freq is None else np.searchsorted(self.frequencies, lower_freq, side="left")
+        stop = len(self) if upper_freq is None else np.searchsorted(self.frequencies, upper_freq, side="right")
+        # Parameter sets not converted yet stay lazy in the slice
+        parameters = {name: None if values is None else values[start:stop] for name, values in self._parameters.items()}
+        return SweepResult(self.frequencies[start:stop], parameters, self.z_charac, self.ports, self.netlist_hash)
+
+    def save(self, filename: str, parameters: list = None):
+        """Write the result to a binary sweep file that load can map into memory.
+
+        The file starts with MAGIC, the length of a JSON header as a little endian uint32 and
+        the header itself, with the netlist hash, z_charac, ports and the offset, dtype and
+        shape of every array. Then come the frequencies as float64 and every parameter set
+        as a contiguous (F, P, P) complex128 array, each aligned to ALIGNMENT bytes.
+
+        Args:
+            filename (str): Path of the file.
+            parameters (list, optional): Parameter sets to write, by default the ones already calculated.
+        """
+        if parameters is None:
+            parameters = [name for name, values in self._parameters.items() if values is not None]
+        arrays = {"frequencies": np.ascontiguousarray(self.frequencies, dtype="<f8")}
+        arrays.update({name: np.ascontiguousarray(self[name], dtype="<c16") for name in parameters})
+
+        z_charac = complex(self.z_charac)
+        header = {"version": self.VERSION, "netlist_hash": self.netlist_hash,
+                  "z_charac": [z_charac.real, z_charac.imag],
+                  "ports": None if self.ports is None else [int(port) for port in self.ports]}
+        # The offsets depend on the header length and the other way around, so grow it until it fits
+        size = 0
+        while True:
+            offset = self.__align(len(self.MAGIC) + 4 + size)
+            layout = {}
+            for name, values in arrays.items():
+                layout[name] = {"offset": offset, "dtype": values.dtype.str, "shape": list(values.shape)}
+                offset = self.__align(offset + values.nbytes)
+            text = json.dumps(dict(header, arrays=layout)).encode()
+            if len(text) <= size:
+                break
+            size = len(text)
+
+        with open(filename, "wb") as file:
+            file.write(self.MAGIC)
+            file.write(np.uint32(size).astype("<u4").tobytes())
+            file.write(text.ljust(size))
+            for name, values in arrays.items():
+                file.write(b"\0" * (layout[name]["offset"] - file.tell()))
+                values.tofile(file)
+
+    @classmethod
+    def load(cls, filename: str, mmap_mode: str = "r") -> "SweepResult":
+        """Open a binary sweep file written by save.
+
+        Args:
+            filename (str): Path of the file.
+            mmap_mode (str, optional): np.memmap mode of the arrays, so only the frequencies and
+                entries used are read from disk. None reads the whole file into memory instead.
+        """
+        with open(filename, "rb") as file:
+            if file.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError(f"{filename} is not a sweep file")
+            size = int(np.frombuffer(file.read(4), dtype="<u4")[0])
+            header = json.loads(file.read(size))
+        if header["version"] > cls.VERSION:
+            raise ValueError(f"Sweep file version {header['version']} is newer than the supported {cls.VERSION}")
+
+        arrays = {}
+        for name, layout in header["arrays"].items():
+            shape = tuple(layout["shape"])
+            if mmap_mode is None:
+                arrays[name] = np.fromfile(filename, dtype=layout["dtype"], count=int(np.prod(shape)),
+                                           offset=layout["offset"]).reshape(shape)
+            elif not np.prod(shape):
+                arrays[name] = np.empty(shape, dtype=layout["dtype"])
+            else:
+                arrays[name] = np.memmap(filename, dtype=layout["dtype"], mode=mmap_mode,
+                                         offset=layout["offset"], shape=shape)
+
+        frequencies = arrays.pop("frequencies")
+        z_charac = complex(*header["z_charac"])
+        if not z_charac.imag:
+            z_charac = z_charac.real
+        return cls(frequencies, arrays, z_charac, header["ports"], header["netlist_hash"])
+
+    @classmethod
+    def __align(cls, offset: int) -> int:
+        return -(-offset // cls.ALIGNMENT) * cls.ALIGNMENT
+
+    def to_touchstone(self, filename: str, parameter: str = "S", data_format: str = "RI", unit: str = "HZ",
+                      precision: int = 9):
+        """Write a parameter set to a Touchstone (.sNp) file, see touchstone.write_touchstone."""
+        comments = [f"Ports: {self.ports}"] if self.ports is not None else None
+        touchstone.write_touchstone(filename, self.frequencies, self[parameter], parameter, data_format,
+                                    self.z_charac, unit, precision, comments)
+
+    def to_dict(self) -> dict:
+        """Convert to the {frequency: {"Y": ..., "Z": ..., "ABCD": ..., "S": ...}} shape of older versions."""
+        parameters = {name: self[name] if name in self else None for name in ("Y", "Z", "ABCD", "S")}
+        return {float(frecuency): {name: None if values is None else values[k] for name, values in parameters.items()}
+                for k, frecuency in enumerate(self.frequencies)}
+
+class ResultCache:
+    """Two tier LRU cache of reduction plans and sweep results.
+
+    Entries are content addressed: plans by topology_hash and results by netlist_hash,
+    so a circuit with the same netlist and sweep always finds its previous result.
+    The memory tier keeps the most recently used entries up to memory_bytes. The disk
+    tier stores plans as JSON and results as .npz files in directory and evicts the
+    least recently used files once they take more than max_bytes.
+
+    Args:
+        directory (str, optional): Directory of the disk tier, None to keep the cache only in memory.
+        max_bytes (int, optional): Size limit of the disk tier.
+        memory_bytes (int, optional): Size limit of the memory tier.
+    """
+
+    EXTENSIONS = (".npz", ".plan.json")
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = 1 << 30, memory_bytes: int = 256 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __remember(self, key: str, entry, size: int):
+        if key in self._memory:
+            self._memory_size -= self._memory.pop(key)[1]
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = (entry, size)
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_size -= evicted_size
+
+    def __recall(self, key: str):
+        if key not in self._memory:
+            return None
+        self._memory.move_to_end(key)
+        return self._memory[key][0]
+
+    def __path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, key + extension)
+
+    def __open(self, key: str, extension: str) -> str:
+        """Path of a disk entry marked as just used, also on memory hits, None if it is not on disk."""
+
+        if self.directory is None:
+            return None
+        path = self.__path(key, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def __store(self, key: str, extension: str, write):
+        """Write a disk entry atomically and evict the least recently used ones over max_bytes.
+
+        An entry larger than max_bytes is not written. Only the cache's own files are
+        counted and evicted, anything else in the directory is left alone.
+        """
+        if self.directory is None:
+            return
+        path = self.__path(key, extension)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            write(file)
+        if os.path.getsize(temporary) > self.max_bytes:
+            os.remove(temporary)
+            return
+        os.replace(temporary, path)
+
+        entries = []
+        for entry in self.__entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def __entries(self) -> list:
+        """Files of the disk tier written by the cache."""
+
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries if entry.name.endswith(self.EXTENSIONS) and entry.is_file()]
+
+    def get_plan(self, key: str) -> ReductionPlan:
+        """Cached reduction plan of a topology_hash, None on a miss."""
+
+        plan = self.__recall("plan:" + key)
+        path = self.__open(key, ".plan.json")
+        if plan is not None:
+            return plan
+        if path is None:
+            return None
+        with open(path) as file:
+            plan = ReductionPlan.from_dict(json.load(file))
+        self.__remember("plan:" + key, plan, os.path.getsize(path))
+        return plan
+
+    def put_plan(self, key: str, plan: ReductionPlan):
+        data = json.dumps(plan.to_dict()).encode()
+        self.__remember("plan:" + key, plan, len(data))
+        self.__store(key, ".plan.json", lambda file: file.write(data))
+
+    def get_result(self, key: str) -> SweepResult:
+        """Cached sweep result of a netlist_hash, None on a miss.
+
+        Every hit returns a new SweepResult over the same read only arrays, so conversions
+        done on one of them are not shared but the cached data can not be modified.
+        """
+        entry = self.__recall("result:" + key)
+        path = self.__open(key, ".npz")
+        if entry is None:
+            if path is None:
+                return None
+            with np.load(path) as data:
+                parameters = {name[len("param_"):]: data[name] for name in data.files if name.startswith("param_")}
+                entry = (data["frequencies"], parameters, data["z_charac"].item(),
+                         data["ports"].tolist() if "ports" in data.files else None)
+            for values in (entry[0], *parameters.values()):
+                values.flags.writeable = False
+            self.__remember("result:" + key, entry, sum(values.nbytes for values in (entry[0], *parameters.values())))
+
+        frequencies, parameters, z_charac, ports = entry
+        return SweepResult(frequencies, parameters, z_charac, ports, key)
+
+    def put_result(self, key: str, result: SweepResult):
+        """Store the parameter sets already calculated in a result, usually only Y."""
+
+        parameters = {name: np.array(values) for name, values in result._parameters.items() if values is not None}
+        frequencies = np.array(result.frequencies)
+        for values in (frequencies, *parameters.values()):
+            values.flags.writeable = False
+        entry = (frequencies, parameters, result.z_charac, result.ports)
+        self.__remember("result:" + key, entry, sum(values.nbytes for values in (frequencies, *parameters.values())))
+
+        arrays = {"param_" + name: values for name, values in parameters.items()}
+        arrays["frequencies"] = frequencies
+        arrays["z_charac"] = np.asarray(result.z_charac)
+        if result.ports is not None:
+            arrays["ports"] = np.asarray(result.ports, dtype=int)
+        self.__store(key, ".npz", lambda file: np.savez(file, **arrays))
+
+    def clear(self):
+        """Drop every entry of both tiers."""
+
+        self._memory.clear()
+        self._memory_size = 0
+        if self.directory is None:
+            return
+        for entry in self.__entries():
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
 
 class Circuit:
     
-    def __init__(self, components: list, input_nodes: list, lower_freq_limit: float, upper_freq_limit: float, freq_step: float, z_charac: float):
+    def __init__(self, components: list, input_nodes: list, lower_freq_limit: float, upper_freq_limit: float, freq_step: float, z_charac: float,
+                 backend: str = "dense", points_per_decade: float = None, frequencies: list = None,
+                 cache: ResultCache = None):
+        if backend not in ("dense", "sparse"):
+            raise ValueError(f"Unknown backend: {backend}, use 'dense' or 'sparse'")
+        if frequencies is not None:
+            frequencies = np.unique(np.asarray(frequencies, dtype=float))
+            lower_freq_limit, upper_freq_limit = frequencies[0], frequencies[-1]
         self._components = components
         self._input_nodes = input_nodes
         self._frecuency = lower_freq_limit
@@ -19,9 +807,31 @@ class Circuit:
         self.y_matrix = None
         self.abcd_matrix = None
         self.s_matrix = None
+        self._reduction_plan = None
+        self._assembler = None
+        self._node_index = None
+        self._matrix_index = None
+        self._backend = backend
+        self._sparse_solver = None
+        self._frequencies = frequencies
+        self._points_per_decade = points_per_decade
+        self._cache = cache
 
-    def impedance_calculator(self):
-        """Convert input components to components_values and components_nodes."""
+    def impedance_calculator(self, frequencies: np.ndarray = None, values: np.ndarray = None):
+        """Convert input components to components_values and components_nodes.
+
+        Args:
+            frequencies (np.ndarray, optional): Whole frequency sweep. If given, the state of the
+                circuit is not modified and the impedances are returned for every frequency instead.
+            values (np.ndarray, optional): (n_samples, n_components) component values to use instead
+                of the ones of the components list, only with frequencies.
+
+        Returns:
+            np.ndarray: (n_components, n_freq) complex impedances, or (n_components, n_samples, n_freq)
+                if values is given. Only if frequencies is given.
+        """
+        if frequencies is not None:
+            return self.__impedance_sweep(frequencies, values)
 
         for component in self._components:
             type_, value, *nodes = component
@@ -32,132 +842,110 @@ class Circuit:
             elif type_ == "L":
                 self._components_values.append(1j * 2 * np.pi * self._frecuency * value)
             elif type_ == "S":
-                relative_permitivity = 4.6 # Relative permitivity of the substrate FR4
-                Beta = 2 * np.pi * self._frecuency * np.sqrt(relative_permitivity)/ 3e8
+                Beta = 2 * np.pi * self._frecuency * np.sqrt(RELATIVE_PERMITIVITY)/ LIGHT_SPEED
                 self._components_values.append(1j * self._z_charac * np.tan(Beta * value))
             elif type_ == "O":
-                relative_permitivity = 4.6 # Relative permitivity of the substrate FR4
-                Beta = 2 * np.pi * self._frecuency * np.sqrt(relative_permitivity)/ 3e8
+                Beta = 2 * np.pi * self._frecuency * np.sqrt(RELATIVE_PERMITIVITY)/ LIGHT_SPEED
                 self._components_values.append(-1j * self._z_charac / np.tan(Beta * value))
                 
             self._components_nodes.append(sorted(nodes))
 
-    def equivalent_circuit(self):
-        """Find the equivalent circuit for a circuit."""
-        parallel_components_set = self.__paralel_branch_finder()
-        serial_components_set = self.__serial_branch_finder()
-
-        while parallel_components_set or serial_components_set:
-            if parallel_components_set:
-                self.__parallel_sum(parallel_components_set)
-                parallel_components_set = self.__paralel_branch_finder()
-                serial_components_set = self.__serial_branch_finder()
-            if serial_components_set:
-                self.__serial_sum(serial_components_set)
-                parallel_components_set = self.__paralel_branch_finder()
-                serial_components_set = self.__serial_branch_finder()
-
-    def __paralel_branch_finder(self) -> list:
-        """Find parallel branches in a circuit."""
-
-        components_frequency = {}
-
-        for i, component_nodes in enumerate(self._components_nodes):
-            component_tuple = tuple(component_nodes)
-            if component_tuple in components_frequency:
-                components_frequency[component_tuple].append(i)
-            else:
-                components_frequency[component_tuple] = [i]
-
-        return [indices for indices in components_frequency.values() if len(indices) > 1]
-
-    def __serial_branch_finder(self) -> list:
-        """Find serial branches in a circuit."""
-
-        nodes_frequency = {}
-        for component_nodes in self._components_nodes:
-            for node in component_nodes:
-                nodes_frequency[node] = nodes_frequency.get(node, 0) + 1
-        #todos los nodos en serie
-        serial_nodes = [num for num, count in nodes_frequency.items() if count == 2]
-        #elimina los nodos de entrada
-        serial_nodes = [i for i in serial_nodes if i not in self._input_nodes]
-        serial_components_set = []
-        for serial_node in serial_nodes:
-            serial_components = []
-            for component, component_nodes in enumerate(self._components_nodes):
-                if serial_node in component_nodes:
-                    serial_components.append(component)
-            serial_components_set.append(serial_components)
-
-        unified = []
-        for pair in serial_components_set:
-            found = None
-            for group in unified:
-                if any(item in group for item in pair):
-                    found = group
-                    break
-            if found:
-                found.update(pair)
-            else:
-                unified.append(set(pair))
+    def __impedance_sweep(self, frequencies: np.ndarray, values: np.ndarray = None) -> np.ndarray:
+        """Calculate the impedance of every component for every frequency in one pass."""
+
+        frequencies = np.asarray(frequencies, dtype=float)
+        types = np.array([component[0] for component in self._components])
+        if values is None:
+            values = np.array([component[1] for component in self._components], dtype=float)
+        else:
+            values = np.asarray(values, dtype=float).T
+        values = values[..., np.newaxis]
+        omega = 2 * np.pi * frequencies
+        beta = omega * np.sqrt(RELATIVE_PERMITIVITY) / LIGHT_SPEED
 
-        return [list(group) for group in unified]
+        unknown = set(types.tolist()) - {"R", "C", "L", "S", "O"}
+        if unknown:
+            raise ValueError(f"Unknown component type: {', '.join(sorted(unknown))}")
 
-    def __serial_sum(self, serial_components_set: list):
-        """Sum the serial components in a circuit."""
+        impedances = np.empty(values.shape[:-1] + frequencies.shape, dtype=complex)
+        with np.errstate(divide="ignore"):
+            mask = types == "R"
+            impedances[mask] = values[mask]
+            mask = types == "C"
+            impedances[mask] = -1j / (omega * values[mask])
+            mask = types == "L"
+            impedances[mask] = 1j * omega * values[mask]
+            mask = types == "S"
+            impedances[mask] = 1j * self._z_charac * np.tan(beta * values[mask])
+            mask = types == "O"
+            impedances[mask] = -1j * self._z_charac / np.tan(beta * values[mask])
 
-        components_to_delete = []
-        for components in serial_components_set:
-            sum_value = sum(self._components_values[component] for component in components)
-            nodes_join = [node for component in components for node in self._components_nodes[component]]
-            new_component_nodes = [x for x in nodes_join if nodes_join.count(x) == 1]
+        return impedances
 
-            self._components_nodes[components[-1]] = new_component_nodes
-            self._components_values[components[-1]] = sum_value
-            components_to_delete.extend(components[:-1])
+    def equivalent_circuit(self, impedances: np.ndarray = None):
+        """Find the equivalent circuit for a circuit.
 
-        self._components_values = [v for i, v in enumerate(self._components_values) if i not in components_to_delete]
-        self._components_nodes = [n for i, n in enumerate(self._components_nodes) if i not in components_to_delete]
+        Args:
+            impedances (np.ndarray, optional): (n_components, n_freq) impedances of the whole sweep,
+                as returned by impedance_calculator. If given, they are reduced with the compiled
+                reduction plan and returned instead of modifying the state of the circuit.
+
+        Returns:
+            np.ndarray: (n_equivalent, n_freq) impedances, only if impedances is given.
+        """
+        if impedances is not None:
+            return self.compile_reduction_plan().apply(impedances)
 
-    def __parallel_sum(self, parallel_components_set: list):
-        """Sum the parallel components in a circuit."""
+        plan = ReductionEngine(self._components_nodes, self._input_nodes).compile()
+        values = np.array(self._components_values, dtype=complex)[:, np.newaxis]
+        self._components_values = list(plan.apply(values)[:, 0])
+        self._components_nodes = plan.components_nodes
 
-        components_to_delete = []
-        for components in parallel_components_set:
-            sum_value = sum(1 / self._components_values[component] for component in components)
-            self._components_values[components[-1]] = 1 / sum_value
-            components_to_delete.extend(components[:-1])
+    def compile_reduction_plan(self) -> ReductionPlan:
+        """Record the merges done by equivalent_circuit once for the topology of the circuit."""
 
-        self._components_values = [v for i, v in enumerate(self._components_values) if i not in components_to_delete]
-        self._components_nodes = [n for i, n in enumerate(self._components_nodes) if i not in components_to_delete]
+        if self._reduction_plan is None:
+            key = topology_hash(self._components, self._input_nodes)
+            if self._cache is not None:
+                self._reduction_plan = self._cache.get_plan(key)
+            if self._reduction_plan is None:
+                components_nodes = [nodes for _, _, *nodes in self._components]
+                self._reduction_plan = ReductionEngine(components_nodes, self._input_nodes).compile()
+                if self._cache is not None:
+                    self._cache.put_plan(key, self._reduction_plan)
+        return self._reduction_plan
 
     def components_to_node(self):
         """Convert the components to nodes."""
 
-        nodes = []
-        for node_num in range(len(self._components_nodes)+1):
-            node  = [component_num for component_num, component in enumerate(self._components_nodes) if node_num in component]
-            if node_num in self._input_nodes:
-                node.append(f"In_{node_num}")
-            nodes.append(node)
-        self._nodes_matrix = [node for node in nodes if node]
+        self._matrix_index = NodeIndex(self._components_nodes, self._input_nodes)
+        self._nodes_matrix = []
+        for row, components in enumerate(self._matrix_index.node_components):
+            node = list(components)
+            if row in self._matrix_index.in_nodes:
+                node.append(f"In_{self._matrix_index.nodes[row]}")
+            self._nodes_matrix.append(node)
+
+    def get_circuit_matrix(self, impedances: np.ndarray = None):
+        """Calculate the circuit matrix for a circuit.
+
+        Args:
+            impedances (np.ndarray, optional): (n_equivalent, n_freq) impedances of the equivalent
+                circuit, as returned by equivalent_circuit. If given, the (n_freq, N, N) circuit
+                matrices of the whole sweep are stamped and returned.
 
-    def get_circuit_matrix(self):
-        """Calculate the circuit matrix for a circuit."""
+        Returns:
+            np.ndarray: (n_freq, N, N) circuit matrices, only if impedances is given.
+        """
+        if impedances is not None:
+            return self.get_assembler().assemble(impedances)
 
         circuit_matrix_len = len(self._nodes_matrix)
         self._circuit_matrix = np.zeros((circuit_matrix_len, circuit_matrix_len), dtype=complex)
-        
-        
-        for j in range(circuit_matrix_len):
-            for i in range(circuit_matrix_len):
-                if i == j:
-                    acc = complex(0, 0)
-                    for component_name in self._nodes_matrix[j]:
-                        if not isinstance(component_name, str):
-                            acc += 1 / self._components_values[component_name]
-                    self._circuit_matrix[j, i] = acc
+
+        for j, node in enumerate(self._nodes_matrix):
+            self._circuit_matrix[j, j] = sum(1 / self._components_values[component_name]
+                                             for component_name in node if not isinstance(component_name, str))
 
         self._in_nodes = []
         for j, node in enumerate(self._nodes_matrix):
@@ -165,119 +953,352 @@ class Circuit:
                 if isinstance(component_name, str):
                     self._in_nodes.append(j)
                     continue
-                node_num = self.__finder(j, component_name, self._nodes_matrix)
+                node_num = self.__finder(j, component_name)
                 if node_num > -1:
-                    self._circuit_matrix[j, node_num] = -1 / self._components_values[component_name]
+                    self._circuit_matrix[j, node_num] -= 1 / self._components_values[component_name]
     
-    def __finder(self, row: int, component_name: str, nodes: np.ndarray) -> int:
+    def get_assembler(self) -> AdmittanceAssembler:
+        """Build the admittance assembler of the equivalent circuit once per topology."""
+
+        if self._assembler is None:
+            self._assembler = AdmittanceAssembler(self.get_node_index())
+        return self._assembler
+
+    def get_node_index(self) -> NodeIndex:
+        """Build the node index of the equivalent circuit once per topology."""
+
+        if self._node_index is None:
+            self._node_index = NodeIndex(self.compile_reduction_plan().components_nodes, self._input_nodes)
+        return self._node_index
+
+    def get_y_sweep(self, frequencies: np.ndarray, values: np.ndarray = None) -> np.ndarray:
+        """Calculate the (n_freq, P, P) Y matrices of the whole sweep with the selected backend.
+
+        With (n_samples, n_components) values, the (n_samples, n_freq, P, P) Y matrices of every
+        set of component values are calculated for the same topology.
+        """
+        impedances = self.equivalent_circuit(self.impedance_calculator(frequencies, values))
+        if self._backend == "sparse":
+            if self._sparse_solver is None:
+                self._sparse_solver = SparseNodalSolver(self.get_assembler())
+            if impedances.ndim > 2:
+                return np.stack([self._sparse_solver.solve(impedances[:, k]) for k in range(impedances.shape[1])])
+            return self._sparse_solver.solve(impedances)
+
+        return self.get_y_matrix(self.get_circuit_matrix(impedances))
+
+    def run_adaptive_simulation(self, initial_points: int = 33, max_points: int = 2000,
+                                mag_tolerance: float = 0.02, phase_tolerance: float = 5.0) -> SweepResult:
+        """Run the simulation on a grid refined around the fast changes of S, like resonances.
+
+        The sweep starts with initial_points evenly spaced between lower_freq_limit and
+        upper_freq_limit. Every interval where |S| changes more than mag_tolerance or the
+        phase of S more than phase_tolerance degrees is bisected, the worst ones first,
+        until no interval changes too fast or max_points frequencies are reached.
+
+        Returns:
+            SweepResult: Result on the refined, non uniform, frequency grid.
+        """
+        if initial_points < 2 or max_points < initial_points:
+            raise ValueError("It needs at least 2 initial points and max_points >= initial_points")
+
+        frequencies = np.linspace(self._frecuency, self._upper_freq_limit, initial_points)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y_matrix = self.get_y_sweep(frequencies)
+            s_matrix = z2param.y2s(y_matrix, self._z_charac)
+
+        while len(frequencies) < max_points:
+            # Largest change of any S entry in every interval, relative to the tolerances
+            mag_change = np.abs(np.diff(np.abs(s_matrix), axis=0)).reshape(len(frequencies) - 1, -1).max(axis=1)
+            phase_change = np.abs(np.angle(s_matrix[1:] * np.conj(s_matrix[:-1]), deg=True))
+            phase_change = phase_change.reshape(len(frequencies) - 1, -1).max(axis=1)
+            error = np.fmax(mag_change / mag_tolerance, phase_change / phase_tolerance)
+
+            # Intervals too narrow to be split in floating point are left alone
+            midpoints = (frequencies[1:] + frequencies[:-1]) / 2
+            splittable = (midpoints > frequencies[:-1]) & (midpoints < frequencies[1:])
+            intervals = np.flatnonzero((error > 1) & splittable)
+            if not len(intervals):
+                break
+
+            intervals = intervals[np.argsort(error[intervals])[::-1]][:max_points - len(frequencies)]
+            new_frequencies = midpoints[intervals]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                new_y = self.get_y_sweep(new_frequencies)
+                new_s = z2param.y2s(new_y, self._z_charac)
+
+            order = np.argsort(np.concatenate([frequencies, new_frequencies]), kind="stable")
+            frequencies = np.concatenate([frequencies, new_frequencies])[order]
+            y_matrix = np.concatenate([y_matrix, new_y])[order]
+            s_matrix = np.concatenate([s_matrix, new_s])[order]
+
+        self.y_matrix = y_matrix
+        return SweepResult(frequencies, {"Y": y_matrix, "S": s_matrix}, self._z_charac,
+                           self.get_node_index().nodes_of(self.get_node_index().in_nodes),
+                           netlist_hash(self._components, self._input_nodes, self._z_charac, frequencies))
+
+    def get_frequencies(self) -> np.ndarray:
+        """Frequencies of the sweep: the given list, a logarithmic sweep if points_per_decade
+        was given, or a linear one from lower_freq_limit to upper_freq_limit in freq_step steps."""
+
+        if self._frequencies is None:
+            self._frequencies = frequency_grid(self._frecuency, self._upper_freq_limit, self._freq_step,
+                                               self._points_per_decade)
+        return self._frequencies
+
+    def sample_values(self, n_samples: int, tolerances, distribution: str = "uniform", seed: int = None) -> np.ndarray:
+        """Draw (n_samples, n_components) component values around the nominal ones.
+
+        Args:
+            n_samples (int): Number of sets of values.
+            tolerances (float | list): Relative tolerance of every component (0.05 for 5 %), or one for all of them.
+            distribution (str, optional): "uniform" draws in nominal * (1 +- tolerance), "normal" uses the
+                tolerance as 3 standard deviations.
+            seed (int, optional): Seed of the random generator, for repeatable studies.
+
+        Returns:
+            np.ndarray: (n_samples, n_components) component values.
+        """
+        nominal = np.array([component[1] for component in self._components], dtype=float)
+        tolerances = np.broadcast_to(np.asarray(tolerances, dtype=float), nominal.shape)
+        generator = np.random.default_rng(seed)
+
+        if distribution == "uniform":
+            deviation = generator.uniform(-1, 1, (n_samples, len(nominal))) * tolerances
+        elif distribution == "normal":
+            deviation = generator.normal(0, 1, (n_samples, len(nominal))) * tolerances / 3
+        else:
+            raise ValueError(f"Unknown distribution: {distribution}, use 'uniform' or 'normal'")
+
+        return nominal * (1 + deviation)
+
+    def run_monte_carlo(self, specs: list, values: np.ndarray = None, n_samples: int = None, tolerances=None,
+                        distribution: str = "uniform", seed: int = None, block_size: int = None) -> dict:
+        """Evaluate many sets of component values over the sweep and check them against S parameter specs.
+
+        Every spec is a list [name, comparison, limit_dB] or [name, comparison, limit_dB, lower_freq, upper_freq],
+        for example ["S21", ">", -3, 1e6, 2e6] asks |S21| over -3 dB between 1 MHz and 2 MHz, and
+        ["S11", "<", -10] asks |S11| under -10 dB in the whole sweep.
+
+        Args:
+            specs (list): S parameter specs every sample has to meet.
+            values (np.ndarray, optional): (n_samples, n_components) component values. If not given they are
+                drawn with sample_values(n_samples, tolerances, distribution, seed).
+            block_size (int, optional): Samples evaluated in each batch, to bound the memory used.
+
+        Returns:
+            dict: "frequencies", "values", "S" (n_samples, n_freq, P, P), "spec_passed" (n_samples, n_specs),
+                "passed" (n_samples,) and "yield", the fraction of samples meeting every spec.
+        """
+        if values is None:
+            values = self.sample_values(n_samples, tolerances, distribution, seed)
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        frequencies = self.get_frequencies()
+
+        if block_size is None:
+            nodes = len(self.get_assembler().nodes)
+            block_size = max(1, int(2e7 // max(1, len(frequencies) * nodes * nodes)))
+
+        s_matrix = []
+        for start in range(0, len(values), block_size):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                y_matrix = self.get_y_sweep(frequencies, values[start:start + block_size])
+                s_matrix.append(z2param.y2s(y_matrix, self._z_charac))
+        s_matrix = np.concatenate(s_matrix)
+
+        spec_passed = np.empty((len(values), len(specs)), dtype=bool)
+        for k, spec in enumerate(specs):
+            name, comparison, limit, *band = spec
+            match = re.fullmatch(r"S(\d)(\d)", name)
+            if match is None:
+                raise ValueError(f"Unknown parameter in spec {spec}, use S parameters like 'S21'")
+            row, col = int(match[1]) - 1, int(match[2]) - 1
+            if not (0 <= row < s_matrix.shape[-1] and 0 <= col < s_matrix.shape[-1]):
+                raise ValueError(f"Spec {spec} is out of the {s_matrix.shape[-1]} ports of the circuit")
+            lower_freq, upper_freq = band if band else (frequencies[0], frequencies[-1])
+            in_band = (frequencies >= lower_freq) & (frequencies <= upper_freq)
+            with np.errstate(divide="ignore"):
+                dB = 20 * np.log10(np.abs(s_matrix[:, in_band, row, col]))
+            if comparison == ">":
+                spec_passed[:, k] = np.all(dB > limit, axis=1)
+            elif comparison == "<":
+                spec_passed[:, k] = np.all(dB < limit, axis=1)
+            else:
+                raise ValueError(f"Unknown comparison in spec {spec}, use '>' or '<'")
+
+        passed = spec_passed.all(axis=1)
+        return {"frequencies": frequencies, "values": values, "S": s_matrix,
+                "spec_passed": spec_passed, "passed": passed, "yield": passed.mean() if len(passed) else 0.0}
+
+    def __serial_y_sweep(self, frequencies: np.ndarray, chunk_size: int = None, progress=None) -> np.ndarray:
+        """Evaluate the sweep in this process one chunk at a time, reporting the progress after each one."""
+
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(frequencies) // PROGRESS_STEPS))
+        elif chunk_size < 1:
+            raise ValueError(f"The chunk size must be at least 1, got {chunk_size}")
+
+        chunks = []
+        for start in range(0, len(frequencies), chunk_size):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                chunks.append(self.get_y_sweep(frequencies[start:start + chunk_size]))
+            progress(min(start + chunk_size, len(frequencies)), len(frequencies))
+        if not chunks:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return self.get_y_sweep(frequencies)
+        return np.concatenate(chunks)
+
+    def __parallel_y_sweep(self, frequencies: np.ndarray, workers: int = None, chunk_size: int = None,
+                           progress=None) -> np.ndarray:
+        """Split the sweep in chunks, evaluate them in a process pool and join them in frequency order."""
+
+        workers = os.cpu_count() if workers is None else workers
+        if workers < 1:
+            raise ValueError(f"The number of workers must be at least 1, got {workers}")
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(frequencies) // workers))
+        elif chunk_size < 1:
+            raise ValueError(f"The chunk size must be at least 1, got {chunk_size}")
+
+        chunks = [frequencies[i:i + chunk_size] for i in range(0, len(frequencies), chunk_size)]
+        if len(chunks) <= 1:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                y_matrix = self.get_y_sweep(frequencies)
+            if progress is not None:
+                progress(len(frequencies), len(frequencies))
+            return y_matrix
+
+        # The topology is reduced once here and sent once to every worker, not with every chunk
+        worker = (self._components, self._input_nodes, self._z_charac, self._backend, self.compile_reduction_plan())
+        pool = dict(max_workers=min(workers, len(chunks)), initializer=_init_sweep_worker, initargs=worker)
+        if progress is None:
+            with ProcessPoolExecutor(**pool) as executor:
+                return np.concatenate(list(executor.map(_y_sweep_chunk, chunks)))
+
+        # Chunks are reported as they finish and joined in frequency order at the end
+        executor = ProcessPoolExecutor(**pool)
+        try:
+            futures = {executor.submit(_y_sweep_chunk, chunk): i for i, chunk in enumerate(chunks)}
+            results = [None] * len(chunks)
+            done = 0
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                done += len(chunks[i])
+                progress(done, len(frequencies))
+        except BaseException:
+            # On errors or cancellation the pending chunks are dropped instead of waited for
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        return np.concatenate(results)
+
+    def __finder(self, row: int, component_name: int) -> int:
         """This function find the component pair and returns the node number where it was allocated.
 
         Args:
             row (int): Current row of circuit matrix .
-            nodes (np.ndarray): nodes matrix.
-            component_name (str): component name want to find it.
+            component_name (int): component name want to find it.
 
         Returns:
             int: Node number where component pair was found, -1 if didn't find it.
         """
-        for i, node in enumerate(nodes):
-            if (i != row) and (component_name in node):
-                return i
-        return -1
-
-    def get_y_matrix(self):
-        """Calculate the Z matrix for a circuit."""
-        
-        total_nodes = set(range(len(self._circuit_matrix)))
-        self._no_in_nodes = list(total_nodes - set(self._in_nodes)) 
+        return self._matrix_index.other_row(component_name, row)
 
-        while len(self._no_in_nodes) > 0:
-            self.__matrix_reduction()
-            self._no_in_nodes = [n - 1 for n in self._no_in_nodes[1:]]
-        
-        self.y_matrix = self._circuit_matrix
+    def get_y_matrix(self, circuit_matrix: np.ndarray = None):
+        """Calculate the Z matrix for a circuit.
 
-    def __matrix_reduction(self):
-        """Reduce a circuit matrix by eliminating the row and column corresponding to the given node."""
+        Args:
+            circuit_matrix (np.ndarray, optional): (n_freq, N, N) circuit matrices, as returned by
+                get_circuit_matrix. If given, they are reduced to the input nodes and returned.
 
-        node = self._no_in_nodes[0]
+        Returns:
+            np.ndarray: (n_freq, P, P) Y matrices, only if circuit_matrix is given.
+        """
+        if circuit_matrix is not None:
+            return kron_reduction(circuit_matrix, self.get_assembler().in_nodes)
 
-        y, x = self._circuit_matrix.shape
-        pivote_value = self._circuit_matrix[node, node]
-        new_matrix = np.zeros((y - 1, x - 1), dtype=complex)
-        new_row = 0
-        for j in range(y):
-            if j == node:
-                continue
-            new_col = 0
-            for i in range(x):
-                if i == node:
-                    continue
-                new_matrix[new_row, new_col] = (self._circuit_matrix[j, i] 
-                                                - self._circuit_matrix[node, i] 
-                                                * self._circuit_matrix[j, node] 
-                                                / pivote_value)
-                new_col += 1
-            new_row += 1
-
-        self._circuit_matrix = new_matrix
+        total_nodes = set(range(len(self._circuit_matrix)))
+        self._no_in_nodes = sorted(total_nodes - set(self._in_nodes))
+        self.y_matrix = kron_reduction(self._circuit_matrix[np.newaxis], sorted(set(self._in_nodes)))[0]
     
     def y2z(self):
-        """Convert Z matrix to Y matrix."""
-        det = np.linalg.det(self.y_matrix)
-        if det:
-            self.z_matrix = np.linalg.inv(self.y_matrix)
-        else:
+        """Convert Y matrix to Z matrix."""
+        if self.y_matrix.ndim == 2 and not np.linalg.det(self.y_matrix):
             self.z_matrix = None
+        else:
+            self.z_matrix = z2param.y2z(self.y_matrix)
 
     def z2abcd(self):
         """Convert Z matrix to ABCD matrix."""
-        if len(self.z_matrix) == 2:
-            det_mat = np.linalg.det(self.z_matrix)
-            C = 1 / self.z_matrix[0][0]
-            D = self.z_matrix[1][1] / self.z_matrix[1][0]
-            A = self.z_matrix[0][0] / self.z_matrix[1][0]
-            B = det_mat / self.z_matrix[1][0]    
-            self.abcd_matrix = np.array([[A, B], [C, D]], dtype=complex)
+        if self.z_matrix.shape[-1] == 2:
+            self.abcd_matrix = z2param.z2abcd(self.z_matrix)
 
     def z2s(self):
         """Convert Z matrix to S matrix."""
-        if len(self.z_matrix) == 2:
-            s_11 = ((self.z_matrix[0][0] - self._z_charac) * (self.z_matrix[1][1] + self._z_charac) - 
-                    (self.z_matrix[0][1] * self.z_matrix[1][0])) / ((self.z_matrix[0][0] + self._z_charac) * 
-                    (self.z_matrix[1][1] + self._z_charac) - (self.z_matrix[0][1] * self.z_matrix[1][0]))
-            s_12 = (2 * self.z_matrix[0][1] * self._z_charac) / ((self.z_matrix[0][0] + self._z_charac) * 
-                    (self.z_matrix[1][1] + self._z_charac) - (self.z_matrix[0][1] * self.z_matrix[1][0]))
-            s_21 = (2 * self.z_matrix[1][0] * self._z_charac) / ((self.z_matrix[0][0] + self._z_charac) * 
-                    (self.z_matrix[1][1] + self._z_charac) - (self.z_matrix[0][1] * self.z_matrix[1][0]))
-            s_22 = ((self.z_matrix[0][0] + self._z_charac) * (self.z_matrix[1][1] - self._z_charac) - 
-                    (self.z_matrix[0][1] * self.z_matrix[1][0])) / ((self.z_matrix[0][0] + self._z_charac) * 
-                    (self.z_matrix[1][1] + self._z_charac) - (self.z_matrix[0][1] * self.z_matrix[1][0]))
-            self.s_matrix = np.array([[s_11, s_12], [s_21, s_22]], dtype=complex)
-
-    def run_simulation(self):
-        """Run the circuit simulation."""
-        circuit = {}
-        while self._frecuency <= self._upper_freq_limit:
-
-            matrix = {}
-            self.impedance_calculator()
-            self.equivalent_circuit()
-            self.components_to_node()
-            self.get_circuit_matrix()
-            self.get_y_matrix()
-            matrix["Y"] = self.y_matrix
-            self.y2z()
-            matrix["Z"] = self.z_matrix
-            self.z2abcd()
-            matrix["ABCD"] = self.abcd_matrix
-            self.z2s()
-            matrix["S"] = self.s_matrix
-            circuit[self._frecuency] = matrix
-            self._frecuency += self._freq_step
-
-        return circuit
+        self.s_matrix = z2param.z2s(self.z_matrix, self._z_charac)
+
+    def run_simulation(self, workers: int = 1, chunk_size: int = None, progress=None) -> SweepResult:
+        """Run the circuit simulation over the whole sweep at once.
+
+        Only the Y matrices are calculated here, Z, ABCD and S are converted by the
+        returned SweepResult when they are first used.
+
+        Args:
+            workers (int, optional): Number of processes for the sweep, None to use every CPU.
+                With 1 (default) the sweep runs in this process.
+            chunk_size (int, optional): Frequencies evaluated by a process at a time. By default
+                the sweep is split evenly between the workers.
+            progress (callable, optional): Called as progress(done, total) with the number of
+                frequencies evaluated after every chunk. An exception raised by it stops the
+                sweep and is propagated, which is how a running simulation is cancelled.
+                Without chunk_size, a serial sweep is split in PROGRESS_STEPS chunks.
+
+        With a cache, a netlist and sweep simulated before are loaded from it instead.
+        """
+        frequencies = self.get_frequencies()
+        key = self.netlist_hash()
+
+        if self._cache is not None:
+            result = self._cache.get_result(key)
+            if result is not None:
+                self.y_matrix = result["Y"]
+                return result
+
+        if workers == 1 and progress is None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self.y_matrix = self.get_y_sweep(frequencies)
+        elif workers == 1:
+            self.y_matrix = self.__serial_y_sweep(frequencies, chunk_size, progress)
+        else:
+            self.y_matrix = self.__parallel_y_sweep(frequencies, workers, chunk_size, progress)
+
+        result = SweepResult(frequencies, {"Y": self.y_matrix}, self._z_charac,
+                             self.get_node_index().nodes_of(self.get_node_index().in_nodes), key)
+        if self._cache is not None:
+            self._cache.put_result(key, result)
+        return result
+
+    def netlist_hash(self) -> str:
+        """Hash identifying the netlist, input nodes, characteristic impedance and sweep of the circuit."""
+
+        return netlist_hash(self._components, self._input_nodes, self._z_charac, self.get_frequencies())
     
+_worker_circuit = None # Circuit of a process of a parallel simulation, set by _init_sweep_worker
+
+def _init_sweep_worker(components: list, input_nodes: list, z_charac: float, backend: str, plan: ReductionPlan):
+    """Build the circuit of a worker process once, with the reduction plan compiled by the parent process."""
+
+    global _worker_circuit
+    _worker_circuit = Circuit(components, input_nodes, 0, 0, 1, z_charac, backend)
+    _worker_circuit._reduction_plan = plan
+
+def _y_sweep_chunk(frequencies: np.ndarray) -> np.ndarray:
+    """Y matrices of a chunk of the sweep, run by every process of a parallel simulation."""
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _worker_circuit.get_y_sweep(frequencies)
+
 if __name__ == "__main__":
     
     input_nodes = [0,7]
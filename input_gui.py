@@ -1,10 +1,20 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import messagebox
 from circuit_class import Circuit
+import Graficas
 import customtkinter as ctk
 import skrf as rf
 from tkinter import filedialog, messagebox  # Importamos messagebox desde tkinter
 
+# Cada cuántos ms la interfaz revisa el avance de la simulación
+INTERVALO_AVANCE = 100
+
+#Excepción para detener la simulación desde su hilo cuando se cancela
+class SimulacionCancelada(Exception):
+    pass
+
 #Función que selecciona entre cargar o no cargar el archivo s2p
 def toggle_options():
     """Controla la visibilidad de los botones según los checkboxes activos."""
@@ -197,15 +207,93 @@ def save_comp_inf():
                           freq_step=float(s_freq),
                           z_charac=float(i_impedance)
                           )
+        iniciar_simulacion(circuit)
+    else:
+        messagebox.showwarning("Advertencia", "No se ha ingresado suficiente información.")
+
+#Función que ejecuta la simulación en otro hilo y manda su avance y resultado por la cola
+def simular_en_hilo(circuit, cola, cancelar):
+    def avance(hechas, total):
+        if cancelar.is_set():
+            raise SimulacionCancelada
+        cola.put(("avance", hechas / total))
+
+    try:
+        sim_circuit = circuit.run_simulation(progress=avance)
+        # Convertir aquí los parámetros que se van a graficar para no hacerlo en la interfaz
+        for nombre in sim_circuit.keys():
+            sim_circuit[nombre]
+    except SimulacionCancelada:
+        cola.put(("cancelada", None))
+    except Exception as e:
+        cola.put(("error", e))
+    else:
+        cola.put(("resultado", sim_circuit))
+
+#Función para simular sin bloquear la interfaz, con una ventana de avance que permite cancelar
+def iniciar_simulacion(circuit):
+    cola = queue.Queue()
+    cancelar = threading.Event()
+
+    # Ventana de avance, bloquea las demás ventanas mientras se simula
+    ventana_avance = ctk.CTkToplevel(ventana_2)
+    ventana_avance.title("Simulación")
+    ventana_avance.geometry("300x150")
+    etiqueta_avance = ctk.CTkLabel(ventana_avance, text="Simulando el circuito... 0%")
+    etiqueta_avance.pack(pady=10)
+    barra_avance = ctk.CTkProgressBar(ventana_avance)
+    barra_avance.set(0)
+    barra_avance.pack(padx=20, pady=10, fill="x")
+
+    def cancelar_simulacion():
+        cancelar.set()
+        etiqueta_avance.configure(text="Cancelando...")
+        boton_cancelar.configure(state="disabled")
+
+    boton_cancelar = ctk.CTkButton(ventana_avance, text="Cancelar", command=cancelar_simulacion)
+    boton_cancelar.pack(pady=10)
+    ventana_avance.protocol("WM_DELETE_WINDOW", cancelar_simulacion)
+    ventana_avance.grab_set()
+
+    # Revisar la cola desde el ciclo de la interfaz, Tk solo se usa desde este hilo
+    def revisar_cola():
         try:
-            sim_circuit = circuit.run_simulation()
-        except Exception as e:
-            messagebox.showerror("ERROR", f"Ocurrió un error al simular el circuito: {e}")
-        else:
+            while True:
+                mensaje, valor = cola.get_nowait()
+                if mensaje != "avance":
+                    break
+                barra_avance.set(valor)
+                etiqueta_avance.configure(text=f"Simulando el circuito... {valor:.0%}")
+        except queue.Empty:
+            ventana_avance.after(INTERVALO_AVANCE, revisar_cola)
+            return
+
+        ventana_avance.destroy()
+        if mensaje == "resultado":
             messagebox.showinfo("INFO", f"Se ha simulado el circuito correctamente")
-            print(sim_circuit)
+            guardar_resultados(valor)
+            Graficas.mostrar_resultados(valor, ventana_2)
+        elif mensaje == "error":
+            messagebox.showerror("ERROR", f"Ocurrió un error al simular el circuito: {valor}")
+        else:
+            messagebox.showinfo("INFO", "Se canceló la simulación")
+
+    threading.Thread(target=simular_en_hilo, args=(circuit, cola, cancelar), daemon=True).start()
+    ventana_avance.after(INTERVALO_AVANCE, revisar_cola)
+
+#Función para guardar los resultados de la simulación en un archivo Touchstone
+def guardar_resultados(sim_circuit):
+    puertos = len(sim_circuit.ports)
+    archivo = filedialog.asksaveasfilename(defaultextension=f".s{puertos}p",
+                                           filetypes=[(f"Archivos S{puertos}P", f"*.s{puertos}p")])
+    if not archivo:
+        return
+    try:
+        sim_circuit.to_touchstone(archivo)
+    except Exception as e:
+        messagebox.showerror("ERROR", f"No se pudo guardar el archivo: {e}")
     else:
-        messagebox.showwarning("Advertencia", "No se ha ingresado suficiente información.")
+        messagebox.showinfo("INFO", f"Resultados guardados en {archivo}")
 
 # Configuración de estilo de CustomTkinter
 ctk.set_appearance_mode("System")  # Modo de apariencia: "Light", "Dark", "System"
@@ -0,0 +1,355 @@
+import os
+import re
+import time
+import warnings
+
+import numpy as np
+
+# Touchstone (.sNp) files: an option line "# <unit> <parameter> <format> R <z_ref>" followed
+# by one record per frequency, the frequency and the 2 * N^2 numbers of the N-port matrix.
+# 2-ports list their matrix column by column (11 21 12 22), every other size row by row.
+
+UNITS = {"HZ": 1.0, "KHZ": 1e3, "MHZ": 1e6, "GHZ": 1e9}
+FORMATS = ("RI", "MA", "DB")
+PARAMETERS = ("S", "Y", "Z")
+CHUNK_BYTES = 1 << 24
+BLOCK_SIZE = 1 << 16
+
+_COMMENT = re.compile(rb"![^\n]*")
+_OPTION_LINE = re.compile(rb"^[ \t]*#[^\n]*", re.MULTILINE)
+
+class TouchstoneData:
+    """Network data of a Touchstone file.
+
+    Attributes:
+        frequencies (np.ndarray): (F,) frequencies in Hz.
+        parameters (np.ndarray): (F, P, P) complex network parameters, Z and Y already denormalized.
+        parameter (str): Type of the parameters, "S", "Y" or "Z".
+        z_ref (float): Reference impedance of the file.
+        nbytes (int): Size of the parsed file.
+        seconds (float): Time spent reading and parsing it.
+    """
+
+    def __init__(self, frequencies: np.ndarray, parameters: np.ndarray, parameter: str, z_ref: float,
+                 nbytes: int = 0, seconds: float = 0.0):
+        self.frequencies = frequencies
+        self.parameters = parameters
+        self.parameter = parameter
+        self.z_ref = z_ref
+        self.nbytes = nbytes
+        self.seconds = seconds
+
+    def __len__(self) -> int:
+        return len(self.frequencies)
+
+    def __repr__(self) -> str:
+        return (f"TouchstoneData({len(self)} frequencies, {self.ports} ports, {self.parameter} parameters, "
+                f"z_ref={self.z_ref:g}, {self.throughput:.1f} MB/s)")
+
+    @property
+    def ports(self) -> int:
+        return self.parameters.shape[-1]
+
+    @property
+    def throughput(self) -> float:
+        """Parse speed in MB/s."""
+        return self.nbytes / 1e6 / self.seconds if self.seconds else float("inf")
+
+def ports_from_filename(filename: str) -> int:
+    """Number of ports of a file from its .sNp extension."""
+
+    match = re.search(r"\.s(\d+)p$", str(filename), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Can not tell the number of ports of {filename}, it is not a .sNp file")
+    return int(match.group(1))
+
+def parse_options(line: str) -> dict:
+    """Parse an option line, e.g. "# MHz S DB R 50", into unit, parameter, format and z_ref.
+
+    Every option is optional and case insensitive, the defaults are GHz, S, MA and 50 ohms.
+    """
+    options = {"unit": "GHZ", "parameter": "S", "format": "MA", "z_ref": 50.0}
+    tokens = line.lstrip().lstrip("#").upper().split()
+    k = 0
+    while k < len(tokens):
+        token = tokens[k]
+        if token in UNITS:
+            options["unit"] = token
+        elif token in FORMATS:
+            options["format"] = token
+        elif token == "R":
+            try:
+                options["z_ref"] = float(tokens[k + 1])
+            except (IndexError, ValueError):
+                raise ValueError(f"Invalid reference impedance in option line: {line.strip()}")
+            k += 1
+        elif token in PARAMETERS:
+            options["parameter"] = token
+        elif token in ("G", "H"):
+            raise ValueError(f"{token} parameters are not supported")
+        else:
+            raise ValueError(f"Unknown option {token} in option line: {line.strip()}")
+        k += 1
+    return options
+
+def to_complex(pairs: np.ndarray, data_format: str) -> np.ndarray:
+    """Convert (..., 2) pairs of numbers in RI, MA or DB format to complex numbers."""
+
+    first, second = pairs[..., 0], pairs[..., 1]
+    if data_format == "RI":
+        return first + 1j * second
+    if data_format == "DB":
+        first = 10 ** (first / 20)
+    return first * np.exp(1j * np.deg2rad(second))
+
+def from_complex(values: np.ndarray, data_format: str) -> np.ndarray:
+    """Convert complex numbers to (..., 2) pairs of numbers in RI, MA or DB format."""
+
+    if data_format == "RI":
+        return np.stack([values.real, values.imag], axis=-1)
+    magnitude = np.abs(values)
+    if data_format == "DB":
+        with np.errstate(divide="ignore"):
+            magnitude = 20 * np.log10(magnitude)
+    return np.stack([magnitude, np.angle(values, deg=True)], axis=-1)
+
+def _read_header(file) -> tuple:
+    """Read the comments and option line before the data, leaving the file at the first record."""
+
+    options = None
+    while True:
+        position = file.tell()
+        line = file.readline()
+        if not line:
+            break
+        content = _COMMENT.sub(b"", line).strip()
+        if not content:
+            continue
+        if content.startswith(b"["):
+            raise ValueError("Touchstone 2.0 keywords are not supported")
+        if not content.startswith(b"#"):
+            file.seek(position)
+            break
+        if options is None:
+            options = parse_options(content.decode("ascii", "replace"))
+    return options if options is not None else parse_options("#")
+
+def _tokens(file, chunk_bytes: int):
+    """Parse the numbers of the data section in chunks cut at line ends, so the
+    temporaries of the parsing are bounded by chunk_bytes whatever the file size."""
+
+    remainder = b""
+    while True:
+        chunk = file.read(chunk_bytes)
+        if not chunk:
+            break
+        chunk = remainder + chunk
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            remainder = chunk
+            continue
+        chunk, remainder = chunk[:end], chunk[end:]
+        yield _parse_numbers(chunk)
+    if remainder:
+        yield _parse_numbers(remainder)
+
+def _parse_numbers(chunk: bytes) -> np.ndarray:
+    if b"!" in chunk:
+        chunk = _COMMENT.sub(b"", chunk)
+    if b"#" in chunk:
+        chunk = _OPTION_LINE.sub(b"", chunk)
+    # fromstring returns [-1] for blank text instead of an empty array
+    if not chunk.strip():
+        return np.empty(0)
+    # Older numpy only warns, and returns what it read, when the text has something else than numbers
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(chunk, sep=" ")
+        except (ValueError, DeprecationWarning):
+            raise ValueError("Invalid number in the network data") from None
+
+def _records(values: np.ndarray, ports: int, last_frequency: float = -np.inf) -> tuple:
+    """Split the numbers of the data section into (F, 1 + 2 * P^2) records.
+
+    2-port files may end with a noise parameters block, 5 numbers per frequency,
+    which starts at the first frequency not above the previous one and is dropped.
+
+    Returns:
+        tuple: The records and whether the noise block was reached.
+    """
+    width = 1 + 2 * ports ** 2
+    count = len(values) // width
+    if ports == 2 and len(values):
+        # Also the start of a last incomplete record, a noise block may be a single 5 number line
+        frequencies = values[::width]
+        decreasing = np.flatnonzero(np.diff(frequencies, prepend=last_frequency) <= 0)
+        if len(decreasing):
+            count = decreasing[0]
+            return values[:count * width].reshape(count, width), True
+    if len(values) != count * width:
+        raise ValueError(f"The network data does not fit {ports}-port records of {width} numbers")
+    return values.reshape(count, width), False
+
+def _network(records: np.ndarray, ports: int, options: dict) -> tuple:
+    """Frequencies in Hz and (F, P, P) complex matrices of a block of records."""
+
+    frequencies = records[:, 0] * UNITS[options["unit"]]
+    parameters = to_complex(records[:, 1:].reshape(len(records), ports, ports, 2), options["format"])
+    if ports == 2:
+        parameters = parameters.transpose(0, 2, 1)
+    if options["parameter"] == "Z":
+        parameters = parameters * options["z_ref"]
+    elif options["parameter"] == "Y":
+        parameters = parameters / options["z_ref"]
+    return frequencies, parameters
+
+def read_touchstone(filename: str, ports: int = None, chunk_bytes: int = CHUNK_BYTES) -> TouchstoneData:
+    """Read a Touchstone file in bulk.
+
+    The whole data section is tokenized and converted with array operations, a chunk of
+    chunk_bytes at a time, instead of one frequency per line.
+
+    Args:
+        filename (str): Path of the file.
+        ports (int, optional): Number of ports, by default taken from the .sNp extension.
+        chunk_bytes (int, optional): Size of the pieces of the file parsed at a time.
+
+    Returns:
+        TouchstoneData: Frequencies, parameters and options of the file.
+    """
+    if ports is None:
+        ports = ports_from_filename(filename)
+
+    start = time.perf_counter()
+    with open(filename, "rb") as file:
+        options = _read_header(file)
+        values = np.concatenate([np.empty(0), *_tokens(file, chunk_bytes)])
+    records, _ = _records(values, ports)
+    frequencies, parameters = _network(records, ports, options)
+
+    return TouchstoneData(frequencies, parameters, options["parameter"], options["z_ref"],
+                          os.path.getsize(filename), time.perf_counter() - start)
+
+def iter_touchstone(filename: str, block_size: int = BLOCK_SIZE, ports: int = None,
+                    chunk_bytes: int = CHUNK_BYTES):
+    """Read a Touchstone file as a stream of blocks of block_size frequencies.
+
+    Only a chunk of the file and a block of records are held at a time, so files
+    larger than memory can be processed. Every block is converted like read_touchstone
+    does, and its nbytes and seconds are the bytes read and the time spent so far.
+
+    Args:
+        filename (str): Path of the file.
+        block_size (int, optional): Frequencies of every block, the last one may be shorter.
+        ports (int, optional): Number of ports, by default taken from the .sNp extension.
+        chunk_bytes (int, optional): Size of the pieces of the file parsed at a time.
+
+    Yields:
+        TouchstoneData: Consecutive blocks of the file.
+    """
+    if ports is None:
+        ports = ports_from_filename(filename)
+    if block_size < 1:
+        raise ValueError("block_size must be at least 1")
+    block_values = block_size * (1 + 2 * ports ** 2)
+
+    start = time.perf_counter()
+    with open(filename, "rb") as file:
+        options = _read_header(file)
+
+        def block(values: np.ndarray, last_frequency: float) -> tuple:
+            records, noise = _records(values, ports, last_frequency)
+            frequencies, parameters = _network(records, ports, options)
+            data = TouchstoneData(frequencies, parameters, options["parameter"], options["z_ref"],
+                                  file.tell(), time.perf_counter() - start)
+            return data, noise
+
+        pending, size = [], 0
+        last_frequency = -np.inf
+        for values in _tokens(file, chunk_bytes):
+            pending.append(values)
+            size += len(values)
+            if size < block_values:
+                continue
+            values = np.concatenate(pending)
+            full = len(values) - len(values) % block_values
+            for offset in range(0, full, block_values):
+                data, noise = block(values[offset:offset + block_values], last_frequency)
+                if len(data):
+                    yield data
+                if noise:
+                    return
+                last_frequency = values[offset + block_values - (1 + 2 * ports ** 2)]
+            pending, size = [values[full:]], len(values) - full
+
+        if size:
+            data, _ = block(np.concatenate(pending), last_frequency)
+            if len(data):
+                yield data
+
+def _record_format(ports: int, precision: int) -> str:
+    """printf style format of one record, with the line breaks of the Touchstone layout:
+    1 and 2-ports on a single line, bigger networks one matrix row per line, 4 pairs at most."""
+
+    pair = f"%.{precision}g %.{precision}g"
+    if ports <= 2:
+        return "%.15g " + " ".join([pair] * ports ** 2) + "\n"
+    lines = [" ".join([pair] * min(4, ports - start)) for _ in range(ports) for start in range(0, ports, 4)]
+    return "%.15g " + "\n".join(lines) + "\n"
+
+def write_touchstone(filename: str, frequencies: np.ndarray, parameters: np.ndarray, parameter: str = "S",
+                     data_format: str = "RI", z_ref: float = 50, unit: str = "HZ", precision: int = 9,
+                     comments: list = None, block_size: int = BLOCK_SIZE):
+    """Write network data to a Touchstone file.
+
+    Every block of block_size frequencies is converted to a (F, 1 + 2 * P^2) array of
+    numbers and formatted with a single printf style operation, instead of one line at a time.
+
+    Args:
+        filename (str): Path of the file, with the .sNp extension of the number of ports.
+        frequencies (np.ndarray): (F,) frequencies in Hz.
+        parameters (np.ndarray): (F, P, P) complex network parameters, Z and Y not normalized.
+        parameter (str, optional): Type of the parameters, "S", "Y" or "Z".
+        data_format (str, optional): "RI", "MA" or "DB".
+        z_ref (float, optional): Reference impedance, Z and Y are written normalized to it.
+        unit (str, optional): Frequency unit of the file, "HZ", "KHZ", "MHZ" or "GHZ".
+        precision (int, optional): Significant digits of the parameters.
+        comments (list, optional): Lines written as comments at the top of the file.
+        block_size (int, optional): Frequencies formatted at a time.
+    """
+    parameter, data_format, unit = parameter.upper(), data_format.upper(), unit.upper()
+    if parameter not in PARAMETERS:
+        raise ValueError(f"Touchstone files can not store {parameter} parameters, use S, Y or Z")
+    if data_format not in FORMATS:
+        raise ValueError(f"Unknown data format: {data_format}, use RI, MA or DB")
+    if unit not in UNITS:
+        raise ValueError(f"Unknown frequency unit: {unit}, use HZ, KHZ, MHZ or GHZ")
+    if np.imag(z_ref):
+        raise ValueError("Touchstone files need a real reference impedance")
+
+    frequencies = np.asarray(frequencies, dtype=float)
+    parameters = np.asarray(parameters, dtype=complex)
+    if parameters.ndim != 3 or parameters.shape[1] != parameters.shape[2] or len(parameters) != len(frequencies):
+        raise ValueError(f"Expected ({len(frequencies)}, P, P) parameters, got {parameters.shape}")
+    ports = parameters.shape[-1]
+    z_ref = float(np.real(z_ref))
+    record = _record_format(ports, precision)
+
+    with open(filename, "w") as file:
+        for comment in comments or []:
+            file.write(f"! {comment}\n")
+        file.write(f"# {unit} {parameter} {data_format} R {z_ref:.15g}\n")
+
+        for start in range(0, len(frequencies), block_size):
+            block = parameters[start:start + block_size]
+            if parameter == "Z":
+                block = block / z_ref
+            elif parameter == "Y":
+                block = block * z_ref
+            if ports == 2:
+                block = block.transpose(0, 2, 1)
+            numbers = np.empty((len(block), 1 + 2 * ports ** 2))
+            numbers[:, 0] = frequencies[start:start + block_size] / UNITS[unit]
+            numbers[:, 1:] = from_complex(block, data_format).reshape(len(block), -1)
+            file.write((record * len(block)) % tuple(numbers.ravel().tolist()))
@@ -1,100 +1,171 @@
-import cmath
 import numpy as np
 
-Z_matrix = [[1+2j, 2], [3+2j, 1j]]
-
-### Get coeficient to calculate Inverse matrix
-def get_cof(mat, cof, p, q, n):
-    i = 0
-    j = 0
-    for row in range(n):
-        for col in range(n):
-            if row != p and col != q:
-                cof[i][j] = mat[row][col]
-                j += 1
-                if j == n - 1:
-                    j = 0
-                    i += 1
-                    
-### Get adjoint matrix for Inverse matrix                     
-def adjoint(mat, adj):
-    n = len(mat)
-    if n == 1:
-        adj[0][0] = 1
-        return
-    sign = 1
-    cof = [[0] * n for _ in range(n)]
-    for i in range(n):
-        for j in range(n):
-            get_cof(mat, cof, i, j, n)
-            sign = 1 if (i + j) % 2 == 0 else -1
-            adj[j][i] = sign * det(cof, n - 1)        
-
-
-### Function to calculate inverse matrix
-def inverse(mat):
-    n = len(mat)
-    det = det(mat, n)
-    if det == 0:
-        print("Matriz singular, no se puede calcular matriz inversa")
-        return None
-    adj = [[0] * n for _ in range(n)]
-    adjoint(mat, adj)
-    inv = [[adj[i][j] / det for j in range(n)] for i in range(n)]
-    return inv            
-                    
-
-### Function to calculate determinat 
-def det(mat):
-    n = len(mat)
-    if n == 2:
-        return mat[0][0] * mat[1][1] - \
-               mat[0][1] * mat[1][0]
-    res = 0
-    for col in range(n):
-      sub = [[0] * (n - 1) for _ in range(n - 1)]
-      for i in range(1, n):
-          subcol = 0
-          for j in range(n):  
-              if j == col:
-                  continue
-              
-              sub[i - 1][subcol] = mat[i][j]
-              subcol += 1
-              
-      sign = 1 if col % 2 == 0 else -1
-      res += sign * mat[0][col] * det(sub, n - 1)
-    
-    return res
+# Every conversion works on (F, P, P) stacks of matrices (or a single (P, P) matrix)
+# and takes the reference impedances as a scalar, one per port (P,) or one per
+# port and frequency (F, P). S parameters use power waves, so the reference
+# impedances may be complex.
 
-### Z to ABCD ###
-def z2abcd(mat):
-    det_mat = det(mat)
-    if len(mat) == 2:
-        C = 1 / mat[0][0]
-        D = mat[1][1] / mat[1][0]
-        A = mat[0][0] / mat[1][0]
-        B = det_mat / mat[1][0]    
-        ABCD_matrix = [[A, B],[C, D]]
-        return ABCD_matrix
-    else:
-        print("Tamaño de matriz inválido")
-        return None
-        
-test_abcd = z2abcd(Z_matrix)
-test_y = inverse(Z_matrix)
-
-print(test_abcd)
+### Batched linear algebra ###
+def batched_solve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Solve a (F, N, N) stack of linear systems, filling the singular frequencies with NaN."""
+
+    try:
+        return np.linalg.solve(a, b)
+    except np.linalg.LinAlgError:
+        batch = np.broadcast_shapes(a.shape[:-2], b.shape[:-2])
+        a = np.broadcast_to(a, batch + a.shape[-2:])
+        b = np.broadcast_to(b, batch + b.shape[-2:])
+        solution = np.full(batch + b.shape[-2:], np.nan, dtype=complex)
+        for index in np.ndindex(solution.shape[:-2]):
+            try:
+                solution[index] = np.linalg.solve(a[index], b[index])
+            except np.linalg.LinAlgError:
+                pass
+        return solution
+
+def inverse(mat: np.ndarray) -> np.ndarray:
+    """Invert a (F, P, P) stack of matrices, NaN where they are singular."""
+
+    return batched_solve(mat, np.eye(mat.shape[-1], dtype=complex))
+
+def _reference(z_ref, mat: np.ndarray) -> tuple:
+    """Broadcast the reference impedances to (..., P) and get the power wave normalization."""
+
+    z_ref = np.broadcast_to(np.asarray(z_ref, dtype=complex), mat.shape[:-2] + mat.shape[-1:])
+    norm = 1 / (2 * np.sqrt(np.abs(z_ref.real)))
+    return z_ref, norm
+
+def _diag(vector: np.ndarray) -> np.ndarray:
+    """Stack of diagonal matrices from a (..., P) stack of vectors."""
+
+    return np.eye(vector.shape[-1]) * vector[..., np.newaxis, :]
+
+def _two_port(A, B, C, D) -> np.ndarray:
+    """Build a (F, 2, 2) stack from its four (F,) entries."""
+
+    return np.stack([np.stack([A, B], axis=-1), np.stack([C, D], axis=-1)], axis=-2)
+
+def _check_two_port(mat: np.ndarray):
+    if mat.shape[-2:] != (2, 2):
+        raise ValueError(f"ABCD parameters are only defined for 2-ports, got {mat.shape[-1]} ports")
+
+### Z to Y ###
+def z2y(mat: np.ndarray, z_ref=None) -> np.ndarray:
+    return inverse(mat)
+
+### Y to Z ###
+def y2z(mat: np.ndarray, z_ref=None) -> np.ndarray:
+    return inverse(mat)
 
 ### Z to S ###
-def z2s(mat, z_car):
-    if len(mat) == 2:
-        s_11 = ((mat[0][0] - z_car)(mat[1][1] + z_car)-(mat[0][1]*mat[1][0]))/((mat[0][0] + z_car)(mat[1][1] + z_car)-(mat[0][1]*mat[1][0]))
-        s_12 = (2 * mat[0][1] * z_car)/((mat[0][0] + z_car)(mat[1][1] + z_car)-(mat[0][1]*mat[1][0]))
-        s_21 = (2 * mat[1][0] * z_car)/((mat[0][0] + z_car)(mat[1][1] + z_car)-(mat[0][1]*mat[1][0]))
-        s_22 = ((mat[0][0] + z_car)(mat[1][1] - z_car)-(mat[0][1]*mat[1][0]))/((mat[0][0] + z_car)(mat[1][1] + z_car)-(mat[0][1]*mat[1][0]))
-        S_matrix = [[s_11, s_12],[s_21, s_22]]
-        return S_matrix
-    else:
-        return None
-        
\ No newline at end of file
+def z2s(mat: np.ndarray, z_ref=50) -> np.ndarray:
+    """S = F (Z - G*) (Z + G)^-1 F^-1, with G the reference impedances."""
+
+    z_ref, norm = _reference(z_ref, mat)
+    # X (Z + G) = (Z - G*)  ->  (Z + G)^T X^T = (Z - G*)^T
+    x = batched_solve(np.swapaxes(mat + _diag(z_ref), -1, -2), np.swapaxes(mat - _diag(z_ref.conj()), -1, -2))
+    return norm[..., :, np.newaxis] * np.swapaxes(x, -1, -2) / norm[..., np.newaxis, :]
+
+### S to Z ###
+def s2z(mat: np.ndarray, z_ref=50) -> np.ndarray:
+    """Z = F^-1 (I - S)^-1 (S G + G*) F, with G the reference impedances."""
+
+    z_ref, norm = _reference(z_ref, mat)
+    identity = np.eye(mat.shape[-1], dtype=complex)
+    x = batched_solve(identity - mat, mat * z_ref[..., np.newaxis, :] + _diag(z_ref.conj()))
+    return x * norm[..., np.newaxis, :] / norm[..., :, np.newaxis]
+
+### Y to S ###
+def y2s(mat: np.ndarray, z_ref=50) -> np.ndarray:
+    """S = F (I - G* Y) (I + G Y)^-1 F^-1, with G the reference impedances."""
+
+    z_ref, norm = _reference(z_ref, mat)
+    identity = np.eye(mat.shape[-1], dtype=complex)
+    a = identity - z_ref.conj()[..., :, np.newaxis] * mat
+    b = identity + z_ref[..., :, np.newaxis] * mat
+    x = batched_solve(np.swapaxes(b, -1, -2), np.swapaxes(a, -1, -2))
+    return norm[..., :, np.newaxis] * np.swapaxes(x, -1, -2) / norm[..., np.newaxis, :]
+
+### S to Y ###
+def s2y(mat: np.ndarray, z_ref=50) -> np.ndarray:
+    """Y = F^-1 (S G + G*)^-1 (I - S) F, with G the reference impedances."""
+
+    z_ref, norm = _reference(z_ref, mat)
+    identity = np.eye(mat.shape[-1], dtype=complex)
+    x = batched_solve(mat * z_ref[..., np.newaxis, :] + _diag(z_ref.conj()), identity - mat)
+    return x * norm[..., np.newaxis, :] / norm[..., :, np.newaxis]
+
+### Z to ABCD ###
+def z2abcd(mat: np.ndarray, z_ref=None) -> np.ndarray:
+    _check_two_port(mat)
+    z_11, z_12, z_21, z_22 = mat[..., 0, 0], mat[..., 0, 1], mat[..., 1, 0], mat[..., 1, 1]
+    det_mat = z_11 * z_22 - z_12 * z_21
+    return _two_port(z_11 / z_21, det_mat / z_21, 1 / z_21, z_22 / z_21)
+
+### ABCD to Z ###
+def abcd2z(mat: np.ndarray, z_ref=None) -> np.ndarray:
+    _check_two_port(mat)
+    A, B, C, D = mat[..., 0, 0], mat[..., 0, 1], mat[..., 1, 0], mat[..., 1, 1]
+    det_mat = A * D - B * C
+    return _two_port(A / C, det_mat / C, 1 / C, D / C)
+
+### Y to ABCD ###
+def y2abcd(mat: np.ndarray, z_ref=None) -> np.ndarray:
+    _check_two_port(mat)
+    y_11, y_12, y_21, y_22 = mat[..., 0, 0], mat[..., 0, 1], mat[..., 1, 0], mat[..., 1, 1]
+    det_mat = y_11 * y_22 - y_12 * y_21
+    return _two_port(-y_22 / y_21, -1 / y_21, -det_mat / y_21, -y_11 / y_21)
+
+### ABCD to Y ###
+def abcd2y(mat: np.ndarray, z_ref=None) -> np.ndarray:
+    _check_two_port(mat)
+    A, B, C, D = mat[..., 0, 0], mat[..., 0, 1], mat[..., 1, 0], mat[..., 1, 1]
+    det_mat = A * D - B * C
+    return _two_port(D / B, -det_mat / B, -1 / B, A / B)
+
+### S to ABCD ###
+def s2abcd(mat: np.ndarray, z_ref=50) -> np.ndarray:
+    """Direct power wave formulas, so series and shunt elements (singular Z or Y) are still defined."""
+
+    _check_two_port(mat)
+    z_ref, _ = _reference(z_ref, mat)
+    z_1, z_2 = z_ref[..., 0], z_ref[..., 1]
+    s_11, s_12, s_21, s_22 = mat[..., 0, 0], mat[..., 0, 1], mat[..., 1, 0], mat[..., 1, 1]
+    denom = 2 * s_21 * np.sqrt(z_1.real * z_2.real)
+    A = ((z_1.conj() + s_11 * z_1) * (1 - s_22) + s_12 * s_21 * z_1) / denom
+    B = ((z_1.conj() + s_11 * z_1) * (z_2.conj() + s_22 * z_2) - s_12 * s_21 * z_1 * z_2) / denom
+    C = ((1 - s_11) * (1 - s_22) - s_12 * s_21) / denom
+    D = ((1 - s_11) * (z_2.conj() + s_22 * z_2) + s_12 * s_21 * z_2) / denom
+    return _two_port(A, B, C, D)
+
+### ABCD to S ###
+def abcd2s(mat: np.ndarray, z_ref=50) -> np.ndarray:
+    _check_two_port(mat)
+    z_ref, _ = _reference(z_ref, mat)
+    z_1, z_2 = z_ref[..., 0], z_ref[..., 1]
+    A, B, C, D = mat[..., 0, 0], mat[..., 0, 1], mat[..., 1, 0], mat[..., 1, 1]
+    root = np.sqrt(z_1.real * z_2.real)
+    denom = A * z_2 + B + C * z_1 * z_2 + D * z_1
+    s_11 = (A * z_2 + B - C * z_1.conj() * z_2 - D * z_1.conj()) / denom
+    s_12 = 2 * (A * D - B * C) * root / denom
+    s_21 = 2 * root / denom
+    s_22 = (-A * z_2.conj() + B - C * z_1 * z_2.conj() + D * z_1) / denom
+    return _two_port(s_11, s_12, s_21, s_22)
+
+CONVERSIONS = {
+    ("Z", "Y"): z2y, ("Y", "Z"): y2z,
+    ("Z", "S"): z2s, ("S", "Z"): s2z,
+    ("Y", "S"): y2s, ("S", "Y"): s2y,
+    ("Z", "ABCD"): z2abcd, ("ABCD", "Z"): abcd2z,
+    ("Y", "ABCD"): y2abcd, ("ABCD", "Y"): abcd2y,
+    ("S", "ABCD"): s2abcd, ("ABCD", "S"): abcd2s,
+}
+
+def convert(mat: np.ndarray, source: str, target: str, z_ref=50) -> np.ndarray:
+    """Convert a stack of network parameters, e.g. convert(s, "S", "Z", 50)."""
+
+    if source == target:
+        return np.asarray(mat)
+    if (source, target) not in CONVERSIONS:
+        raise ValueError(f"Unknown conversion from {source} to {target}")
+    return CONVERSIONS[source, target](np.asarray(mat), z_ref)